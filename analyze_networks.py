@@ -13,63 +13,42 @@ import operator
 import matplotlib
 from sklearn.preprocessing import StandardScaler
 from statsmodels.stats import multitest
+from window_store import load_networks
+from returns_loader import load_returns
+from window_schedule import WindowSchedule
+from eigenpairs import leading_eigenpair, load_eigenpairs, eigenvector_diffs
+from forward_performance import forward_panel
+from resampling import spearman_inference
+from centrality import company_index, sector_codes, strength_centrality, sector_means, as_dicts
 
 
 def get_centrality(G, degree=True, prec=None, p=0):
     """
     Calculates the centrality of each node and mean centrality of a sector 
     if degree is true we use degree centrality, if not we use eigenvector centrality
+    prec is the matrix of G, if not given the degree centrality is taken from G's edges
     """
-    node_centrality = collections.defaultdict(float)
-    total = 0
+    names = list(G.nodes)
+    codes, sectors = sector_codes([G.nodes[node]['sector'] for node in names])
 
     if not degree:
         # Do eigenvector centrality
-        M = nx.to_numpy_matrix(G)
-        _, eigv = scipy.linalg.eigh(prec, eigvals=(p-1, p-1))
-        total = eigv.sum()
-        for i,node in enumerate(G.nodes):
-            node_centrality[node] = eigv[i][0]/total
+        _, eigv = leading_eigenpair(prec)
+        centrality = eigv[:, 0]/eigv.sum()
     else:
-        # Calculate the weighted edge centrality
-        for node in G.nodes:
-            for edge in G[node]:
-                node_centrality[node] += G[node][edge]['weight']
-                total += G[node][edge]['weight']
+        # Calculate the weighted edge centrality, normalised so the total is 1
+        centrality = strength_centrality(nx.to_numpy_array(G) if prec is None else prec)
 
-        # Normalise so the total is 1
-        for comp in node_centrality:
-            node_centrality[comp] = node_centrality[comp]/total
-
-    sorted_centrality = sort_dict(node_centrality)
-    centrality_names = [x[0] for x in sorted_centrality]
-    centrality_sectors = []
-
-    for name in centrality_names:
-        centrality_sectors.append(G.nodes[name]['sector'])
-
-    # Figure out the mean centrality of a sector
-    sector_centrality = collections.defaultdict(float)
-    no_companies_in_sector = collections.defaultdict(int)
-
-    for comp in G:
-        sector = G.nodes[comp]['sector']
-        sector_centrality[sector] += node_centrality[comp]
-        no_companies_in_sector[sector] += 1
-    for sec in sector_centrality:
-        sector_centrality[sec] /= no_companies_in_sector[sec]
-
-    return node_centrality, sector_centrality
+    return as_dicts(centrality, names, sector_means(centrality, codes, len(sectors)), sectors)
 
 def turn_dict_into_np_array(dct, company_names):
     """
     Turns the dct into a numpy array where the keys are held in company_names
     """
-    company_names = list(company_names)
-    ret_arr = np.zeros(len(company_names))
+    index = company_index(company_names)
+    ret_arr = np.zeros(len(index))
     for key in dct:
-        i = company_names.index(key)
-        ret_arr[i] = dct[key]
+        ret_arr[index[key]] = dct[key]
 
     return ret_arr
 
@@ -126,9 +105,9 @@ def get_sector_full_nice_name(sector):
 
 def run(**params):
     #df = pd.DataFrame.from_csv("s_and_p_500_sector_tagged.csv")
-    df = pd.read_csv(params['input_name'], index_col=0)
-    company_sectors = df.iloc[0, :].values
-    company_names = df.T.index.values
+    data = load_returns(params['input_name'], params.get('cache_dir'), dtype=params.get('dtype', np.float64), mmap=params.get('mmap', False))
+    company_sectors = data.company_sectors
+    company_names = data.company_names
     sectors = list(sorted(set(company_sectors)))
     num_sectors = len(sectors)
     company_sector_lookup = {}
@@ -136,110 +115,61 @@ def run(**params):
     for i,comp in enumerate(company_names):
         company_sector_lookup[comp] = company_sectors[i]
 
-    df_2 = df.iloc[1:, :]
-    df_2 = df_2.apply(pd.to_numeric)
-    df_2 = np.log(df_2) - np.log(df_2.shift(1))
-    X = df_2.values[1:, :]
+    X = data.X
 
-    window_size = 300
-    slide_size = 30
-    no_samples = X.shape[0]
     p = X.shape[1]
-    no_runs = math.floor((no_samples - window_size) / (slide_size))
-    dates = []
-
-    for x in range(no_runs-1):
-        dates.append(df.index[(x+1)*slide_size+window_size][0:10])
-
-    dates_2 = []
-
-    for x in range(no_runs):
-        dates_2.append(df.index[(x+1)*slide_size+window_size][0:10])
+    schedule = WindowSchedule.from_returns(data, params.get('window_size', 300), params.get('slide_size', 30))
+    no_runs = schedule.no_runs
 
     # Change this if you wish to analyze either correlation or partial correlation networks
     for folder in [params['cor_dir'], params['pcor_dir']]:
         network_type = folder.split('/')[1]
         networks_folder = folder
-        onlyfiles = [os.path.abspath(os.path.join(networks_folder, f)) for f in os.listdir(networks_folder) if os.path.isfile(os.path.join(networks_folder, f))]
-        #onlyfiles = onlyfiles[0:1]
-        #onlyfiles = list(map(lambda x: os.path.splitext(x)[0], onlyfiles))
-        Graphs = []
-
-        # Sort the files into order
-        ind = [int(Path(x).stem[23:]) for x in onlyfiles]
-        ind = np.argsort(np.array(ind))
-
-        for i in ind:
-            f = onlyfiles[i]
-            G = nx.read_graphml(f)
-            Graphs.append(G)
-
-        number_graphs = len(Graphs)
-        number_companies = len(G)
-
-        sector_centrality_lst_degree = []
-        node_centrality_lst_degree = []
-        sector_centrality_lst_eigv = []
-        node_centrality_lst_eigv = []
-
-        sharpe_ratios = np.zeros(number_graphs*number_companies)
-        centralities_degree = np.zeros(number_companies*number_graphs)
-        centralities_eigv = np.zeros(number_companies*number_graphs)
-
-        risks = np.zeros(number_companies*number_graphs)
-        ls = []
-        edge_weights = []
-
-        max_eigs = np.zeros(no_runs)
-
-        max_eigv = np.zeros((no_runs, p))
-        max_eigv_diff = np.zeros(no_runs-1)
-
-        for i,G in enumerate(Graphs):
-            prec = np.array(nx.to_numpy_matrix(G))
-            eigs, eigv = scipy.linalg.eigh(prec, eigvals=(p-1, p-1))
-            max_eigs[i] = eigs
-            eigv = eigv/eigv.sum()
-            max_eigv[i, :] = eigv.flatten()
-            if i > 0:
-                max_eigv_diff[i-1] = np.linalg.norm(max_eigv[i-1,:] - eigv)
-
-            node_centrality_degree, sector_centrality_degree = get_centrality(G)
-            node_centrality_eigv, sector_centrality_eigv = get_centrality(G, degree=False, prec=prec, p=p)
-
-            sector_centrality_lst_degree.append(sector_centrality_degree)
-            node_centrality_lst_degree.append(node_centrality_degree)
-            sector_centrality_lst_eigv.append(sector_centrality_eigv)
-            node_centrality_lst_eigv.append(node_centrality_eigv)
-
-            edge_weights.append(prec.flatten())
-
-            X_new = X[x*slide_size:(x+1)*slide_size+window_size, :]
-            S = np.cov(X_new.T)
-            ret = np.mean(X_new, axis=0)
-
-            # Look at the returns
-            if i + 1 < number_graphs:
-                X_new = X[(i+1)*slide_size:(i+2)*slide_size+window_size, :]
-            ret = np.mean(X_new, axis=0)
-            risk = np.std(X_new, axis=0)
-            
-            np.seterr(divide='warn', invalid='warn')
-            sharpe = np.divide(ret, risk)
-            degree_centrality = turn_dict_into_np_array(node_centrality_degree, company_names)
-            eigv_centrality = turn_dict_into_np_array(node_centrality_eigv, company_names)
-
-            sharpe_ratios[i*number_companies:(i+1)*number_companies] = sharpe.flatten()
-            centralities_degree[i*number_companies:(i+1)*number_companies] = degree_centrality
-            risks[i*number_companies:(i+1)*number_companies] = risk.flatten()
-            centralities_eigv[i*number_companies:(i+1)*number_companies] = eigv_centrality
+        # Sparse stores keep the graphs at O(nnz) edges
+        sparse = params.get('sparse', False)
+        matrices, manifest = load_networks(networks_folder, sparse=sparse)
+
+        number_graphs = matrices.shape[0]
+        number_companies = matrices.shape[1]
+
+        # Columns of the returns holding the companies of the networks, and their sector codes
+        index = company_index(company_names)
+        columns = np.array([index[name] for name in manifest['company_names']])
+        codes, centrality_sectors = sector_codes(company_sectors)
+
+        # Centralities of every window, one row per window aligned to company_names
+        degree_centralities = np.zeros((number_graphs, number_companies))
+        eigv_centralities = np.zeros((number_graphs, number_companies))
+
+        # Solved once per folder and saved in its store
+        max_eigs, max_eigv = load_eigenpairs(networks_folder, matrices, sparse)
+        max_eigv = max_eigv / max_eigv.sum(axis=1, keepdims=True)
+        max_eigv_diff = eigenvector_diffs(max_eigv)
+
+        for i in range(number_graphs):
+            prec = matrices[i] if sparse else np.array(matrices[i])
+
+            degree_centralities[i, columns] = strength_centrality(prec)
+            eigv_centralities[i, columns] = max_eigv[i, :]
+        matrices.close()
+
+        # Returns of the window after every window, the last window has none after it
+        np.seterr(divide='warn', invalid='warn')
+        _, risk_panel, sharpe_panel = forward_panel(X, schedule)
+
+        sharpe_ratios = sharpe_panel.ravel()
+        risks = risk_panel.ravel()
+        centralities_degree = degree_centralities.ravel()
+        centralities_eigv = eigv_centralities.ravel()
+        sector_centralities_degree = sector_means(degree_centralities, codes, len(centrality_sectors))
+        sector_centralities_eigv = sector_means(eigv_centralities, codes, len(centrality_sectors))
         
         f = open(params['output_dest']+'eigv_centralities_'+network_type, 'w')
         for company_name in company_names:
             f.write(company_name + ';')
         f.write('\n')
 
-        for i in range(len(Graphs)):
+        for i in range(number_graphs):
             for j in range(number_companies):
                 f.write(str(centralities_eigv[i*number_companies + j]) + ';')
             f.write('\n')
@@ -262,8 +192,22 @@ def run(**params):
         f.write(str(spearmanr(centralities_eigv, risks)))
         f.close()
 
-        dt = pd.to_datetime(dates_2)
-        dt_2 = pd.to_datetime(dates)
+        # Uncertainty of the correlations above, by resampling the windows and permuting within them
+        resamples = params.get('resamples', 1000)
+        if resamples:
+            f = open(params['output_dest']+'correlation_inference_'+network_type, 'w')
+            f.write("Block bootstrap confidence intervals and permutation p-values: (" + network_type + ")\n")
+            for centrality_name, centrality in [("degree centrality", degree_centralities), ("eigenvector centrality", eigv_centralities)]:
+                for performance_name, performance in [("Sharpe Ratio", sharpe_panel), ("risks", risk_panel)]:
+                    result = spearman_inference(centrality, performance, resamples, params.get('block_size'),
+                                                seed=params.get('seed'), workers=params.get('workers', 1))
+                    f.write("Correlation between %s and %s: rho=%.6f, 95%% confidence interval [%.6f, %.6f], p-value=%.6g (%d pairs, %d resamples, blocks of %d windows)\n"
+                            % (centrality_name, performance_name, result['rho'], result['ci_low'], result['ci_high'],
+                               result['p_value'], result['n'], result['resamples'], result['block_size']))
+            f.close()
+
+        dt = schedule.dates()
+        dt_2 = dt[1:]
 
         ts = pd.Series(max_eigs, index=dt)
         plt.figure()
@@ -277,42 +221,17 @@ def run(**params):
         ax = plt.gca()
         ax.set_ylim(0, 1.5)
 
-        sector_centrality_over_time = collections.defaultdict(list)
-        ss = []
-        for centrality in sector_centrality_lst_degree: 
-            s = sum(centrality.values())
-            ss.append(s)
-            #s = 1
-            for sector in centrality:
-                sector_centrality_over_time[sector].append(centrality[sector]/s)
-
-        sector_centrality = pd.DataFrame()
-        for sector in sector_centrality_over_time:
-            ts = pd.Series(sector_centrality_over_time[sector], index=dt)
-            sector_nice_name = get_sector_full_nice_name(sector)
-            sector_centrality[sector_nice_name] = ts
-
-        sector_centrality.plot(color = ['#1f77b4', '#aec7e8', '#ff7f0e', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf', '#ff9896'], legend=False)
-        plt.title("Degree Centrality")
-        plt.ylim(0, 0.20)
-
-        sector_centrality_over_time = collections.defaultdict(list)
-        ss = []
-        for centrality in sector_centrality_lst_eigv: 
-            s = sum(centrality.values())
-            ss.append(s)
-            #s = 1
-            for sector in centrality:
-	            sector_centrality_over_time[sector].append(centrality[sector]/s)
-
-        sector_centrality = pd.DataFrame()
-        for sector in sector_centrality_over_time:
-            ts = pd.Series(sector_centrality_over_time[sector], index=dt)
-            sector_nice_name = get_sector_full_nice_name(sector)
-            sector_centrality[sector_nice_name] = ts
-        sector_centrality.plot(color = ['#1f77b4', '#aec7e8', '#ff7f0e', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf', '#ff9896'], legend=False)
-        plt.title("Eigenvector Centrality")
-        plt.ylim(0, 0.20)
+        for title, sector_centralities in [("Degree Centrality", sector_centralities_degree), ("Eigenvector Centrality", sector_centralities_eigv)]:
+            # Share of each sector in the total of the sector means of a window
+            shares = sector_centralities / sector_centralities.sum(axis=1, keepdims=True)
+            sector_centrality = pd.DataFrame()
+            for k, sector in enumerate(centrality_sectors):
+                ts = pd.Series(shares[:, k], index=dt)
+                sector_nice_name = get_sector_full_nice_name(sector)
+                sector_centrality[sector_nice_name] = ts
+            sector_centrality.plot(color = ['#1f77b4', '#aec7e8', '#ff7f0e', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf', '#ff9896'], legend=False)
+            plt.title(title)
+            plt.ylim(0, 0.20)
         save_open_figures(params['output_dest']+network_type+"_financial_networks_graphml_")
         plt.close('all')
 
@@ -0,0 +1,77 @@
+import numpy as np
+import scipy.sparse
+
+
+def company_index(company_names):
+    """
+    Returns a dict from every company name to its column, built once instead of searching the names
+    """
+    return {name: i for i, name in enumerate(company_names)}
+
+
+def sector_codes(company_sectors):
+    """
+    Turns the sector of every company into an integer code, sectors are numbered in the
+    order they first appear
+
+    Returns
+    -------
+    tuple (codes, sectors)
+        codes is a length p int array and sectors the sector name of every code
+    """
+    company_sectors = np.asarray(company_sectors)
+    sectors, first, codes = np.unique(company_sectors, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    # Renumber the sorted codes by first appearance
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[codes], list(sectors[order])
+
+
+def strength_centrality(M):
+    """
+    Weighted degree (strength) of every node normalised so the strengths of a window sum to 1,
+    for one (p, p) matrix, a (windows, p, p) stack or a scipy sparse matrix
+
+    Returns
+    -------
+    array_like
+        (p,) or (windows, p) centralities, the same as summing the weights of the edges of
+        every node of matrix_to_graph(M), self loops once
+    """
+    if scipy.sparse.issparse(M):
+        strength = np.asarray(M.sum(axis=1)).ravel()
+    else:
+        strength = np.asarray(M).sum(axis=-1)
+    return strength / strength.sum(axis=-1, keepdims=True)
+
+
+def sector_means(centrality, codes, no_sectors=None):
+    """
+    Mean centrality of the companies of every sector with np.bincount, for a (p,) vector
+    or a (windows, p) stack of centralities
+
+    Returns
+    -------
+    array_like
+        (no_sectors,) or (windows, no_sectors) means
+    """
+    centrality = np.asarray(centrality)
+    if no_sectors is None:
+        no_sectors = codes.max() + 1
+    counts = np.bincount(codes, minlength=no_sectors)
+    if centrality.ndim == 1:
+        return np.bincount(codes, weights=centrality, minlength=no_sectors) / counts
+    # Give every window its own range of codes so one bincount covers the stack
+    windows = centrality.shape[0]
+    stacked = (codes[None, :] + no_sectors * np.arange(windows)[:, None]).ravel()
+    sums = np.bincount(stacked, weights=centrality.ravel(), minlength=windows * no_sectors)
+    return sums.reshape(windows, no_sectors) / counts
+
+
+def as_dicts(centrality, company_names, sector_centrality, sectors):
+    """
+    Adapter for code expecting dicts: returns the centrality of a window keyed by company
+    and its sector means keyed by sector
+    """
+    return dict(zip(company_names, centrality)), dict(zip(sectors, sector_centrality))
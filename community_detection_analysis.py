@@ -5,12 +5,14 @@ from scipy.stats import distributions
 import pandas as pd
 import math
 import louvain_cython as lcn
+from returns_loader import load_returns
+from window_schedule import WindowSchedule
 
 
 def run(**params):
-    df = pd.read_csv(params['input_name'], index_col=0)
-    company_sectors = df.iloc[0, :].values
-    company_names = df.T.index.values
+    data = load_returns(params['input_name'], params.get('cache_dir'), dtype=params.get('dtype', np.float64), mmap=params.get('mmap', False))
+    company_sectors = data.company_sectors
+    company_names = data.company_names
     sectors = list(sorted(set(company_sectors)))
     num_sectors = len(sectors)
     company_sector_lookup = {}
@@ -18,21 +20,12 @@ def run(**params):
     for i,comp in enumerate(company_names):
         company_sector_lookup[comp] = company_sectors[i]
 
-    df_2 = df.iloc[1:, :]
-    df_2 = df_2.apply(pd.to_numeric)
-    df_2 = np.log(df_2) - np.log(df_2.shift(1))
-    X = df_2.values[1:, :]
+    X = data.X
 
-    window_size = 300
-    slide_size = 30
-    no_samples = X.shape[0]
     p = X.shape[1]
-    no_runs = math.floor((no_samples - window_size)/ (slide_size))
-    dates = []
-
-    for x in range(no_runs):
-        dates.append(df.index[(x+1)*slide_size+window_size][0:10])
-    dt = pd.to_datetime(dates)
+    schedule = WindowSchedule.from_returns(data, params.get('window_size', 300), params.get('slide_size', 30))
+    no_runs = schedule.no_runs
+    dt = schedule.dates()
     dt_2 = dt[1:]
     networks_folder_correlation = params['cor_dir']
     networks_folder_partial_correlation = params['pcor_dir']
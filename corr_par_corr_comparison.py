@@ -12,6 +12,10 @@ import operator
 import matplotlib
 from statsmodels.stats import multitest
 import itertools
+from window_store import load_networks, packed_size, packed_window
+from returns_loader import load_returns
+from window_schedule import WindowSchedule
+from eigenpairs import load_eigenpairs, eigenvector_diffs
 
 def get_sector_full_nice_name(sector):
     """
@@ -43,88 +47,47 @@ def get_sector_full_nice_name(sector):
 
 def run(**params):
     np.seterr(all='raise')
-    df = pd.read_csv(params['input_name'], index_col=0)
-    company_sectors = df.iloc[0, :].values
-    company_names = df.T.index.values
+    data = load_returns(params['input_name'], params.get('cache_dir'), dtype=params.get('dtype', np.float64), mmap=params.get('mmap', False))
+    company_sectors = data.company_sectors
+    company_names = data.company_names
     sectors = list(sorted(set(company_sectors)))
     num_sectors = len(sectors)
-    df_2 = df.iloc[1:, :]
-    df_2 = df_2.apply(pd.to_numeric)
-    df_2 = np.log(df_2) - np.log(df_2.shift(1))
-    X = df_2.values[1:, :]
+    X = data.X
 
-    window_size = 300
-    slide_size = 30
-    no_samples = X.shape[0]
-    no_runs = math.floor((no_samples - window_size)/ (slide_size))
-    dates = []
+    schedule = WindowSchedule.from_returns(data, params.get('window_size', 300), params.get('slide_size', 30))
+    no_runs = schedule.no_runs
+    dt = schedule.dates()
 
-    for x in range(no_runs):
-        dates.append(df.index[(x+1)*slide_size+window_size][0:10])
+    matrices_correlation, _ = load_networks(params['cor_dir'])
+    matrices_partial_correlation, _ = load_networks(params['pcor_dir'])
 
-    dt = pd.to_datetime(dates)
-
-    networks_folder_correlation = params['cor_dir']
-    onlyfiles = [os.path.abspath(os.path.join(networks_folder_correlation, f)) for f in os.listdir(networks_folder_correlation) if os.path.isfile(os.path.join(networks_folder_correlation, f))]
-    #onlyfiles = onlyfiles[0:1]
-    #onlyfiles = list(map(lambda x: os.path.splitext(x)[0], onlyfiles))
-    Graphs_correlation = []
-
-    # Sort the files into order
-    ind = [int(Path(x).stem[23:]) for x in onlyfiles]
-    ind = np.argsort(np.array(ind))
-
-    for i in ind:
-        f = onlyfiles[i]
-        G = nx.read_graphml(f)
-        Graphs_correlation.append(G)
-
-    number_graphs = len(Graphs_correlation)
-    number_companies = len(Graphs_correlation[0])
+    number_graphs = matrices_correlation.shape[0]
+    number_companies = matrices_correlation.shape[1]
     p = number_companies
-    networks_folder_partial_correlation = params['pcor_dir']
-    onlyfiles = [os.path.abspath(os.path.join(networks_folder_partial_correlation, f)) for f in os.listdir(networks_folder_partial_correlation) if os.path.isfile(os.path.join(networks_folder_partial_correlation, f))]
-    #onlyfiles = onlyfiles[0:1]
-    #onlyfiles = list(map(lambda x: os.path.splitext(x)[0], onlyfiles))
-    Graphs_partial_correlation = []
 
-    # Sort the files into order
-    #ind = [int(Path(x).stem[18:]) for x in onlyfiles]
-    ind = [int(Path(x).stem[23:]) for x in onlyfiles]
-    ind = np.argsort(np.array(ind))
-
-    for i in ind:
-        f = onlyfiles[i]
-        G = nx.read_graphml(f)
-        Graphs_partial_correlation.append(G)
-
-    par_corr_vals = np.zeros((number_companies ** 2 * 140))
-    corr_vals = np.zeros((number_companies ** 2 * 140))
-    correlation_eigv_diff = np.zeros(number_graphs-1)
-    partial_correlation_eigv_diff = np.zeros(number_graphs-1)
+    # Only the upper triangles, the networks are symmetric with a unit diagonal
+    m = packed_size(p)
+    par_corr_vals = np.zeros(m * number_graphs)
+    corr_vals = np.zeros(m * number_graphs)
     corr_par_corr_diff = np.zeros(number_graphs)
-    corr_eigv = np.zeros((number_graphs, p))
-    par_corr_eigv = np.zeros((number_graphs, p))
+    # The same eigenpairs analyze_networks solves, read back from the stores once saved
+    _, corr_eigv = load_eigenpairs(params['cor_dir'], matrices_correlation)
+    _, par_corr_eigv = load_eigenpairs(params['pcor_dir'], matrices_partial_correlation)
+    corr_eigv = corr_eigv / corr_eigv.sum(axis=1, keepdims=True)
+    par_corr_eigv = par_corr_eigv / par_corr_eigv.sum(axis=1, keepdims=True)
+    correlation_eigv_diff = eigenvector_diffs(corr_eigv)
+    partial_correlation_eigv_diff = eigenvector_diffs(par_corr_eigv)
 
 
     for i in range(number_graphs):
-        correlation = nx.to_numpy_array(Graphs_correlation[i])
-        par_corr = nx.to_numpy_array(Graphs_partial_correlation[i])
-        corr_vals[i*(p**2):(i+1)*(p**2)] = correlation.flatten()
-        par_corr_vals[i*(p**2):(i+1)*(p**2)] = par_corr.flatten()
+        correlation = np.array(matrices_correlation[i])
+        par_corr = np.array(matrices_partial_correlation[i])
+        corr_vals[i*m:(i+1)*m] = packed_window(matrices_correlation, i)
+        par_corr_vals[i*m:(i+1)*m] = packed_window(matrices_partial_correlation, i)
 
         corr_par_corr_diff[i] = spearmanr(correlation.flatten(), par_corr.flatten())[0]
-        eigs, eigv = scipy.linalg.eigh(correlation, eigvals=(p-1, p-1))
-        eigv = eigv/eigv.sum()
-        corr_eigv[i, :] = eigv.flatten()
-        if i > 0:
-            correlation_eigv_diff[i-1] = np.linalg.norm(corr_eigv[i-1,:] - eigv)
-
-        eigs, eigv = scipy.linalg.eigh(par_corr, eigvals=(p-1, p-1))
-        eigv = eigv/eigv.sum()
-        par_corr_eigv[i, :] = eigv.flatten()
-        if i > 0:
-            partial_correlation_eigv_diff[i-1] = np.linalg.norm(par_corr_eigv[i-1,:] - eigv)
+    matrices_correlation.close()
+    matrices_partial_correlation.close()
 
     #for i in range(number_graphs-1):
     #    corr_par_corr_kendall_tau[i] = scipy.stats.kendalltau(largest_corr_par_corr_diff[:, i+1], largest_corr_par_corr_diff[:, i])[0]
@@ -14,6 +14,10 @@ import statsmodels.tsa.stattools
 from sklearn.preprocessing import StandardScaler
 from statsmodels.stats import multitest
 from sklearn.covariance import LedoitWolf
+from window_store import load_networks
+from returns_loader import load_returns
+from window_schedule import WindowSchedule
+from eigenpairs import leading_eigenpair
 
 def get_centrality(G, degree=True):
     """
@@ -25,8 +29,7 @@ def get_centrality(G, degree=True):
 
     if not degree:
         # Do eigenvector centrality
-        M = nx.to_numpy_matrix(G)
-        _, eigv = scipy.linalg.eigh(prec, eigvals=(p-1, p-1))
+        _, eigv = leading_eigenpair(nx.to_numpy_array(G))
         total = eigv.sum()
         for i,node in enumerate(G.nodes):
             node_centrality[node] = eigv[i][0]/total
@@ -149,43 +152,22 @@ def plot_bar_chart(vals, label=None, title=None, xlabel=None, ylabel=None):
     plt.ylabel(ylabel)
 
 np.seterr(all='raise')
-df = pd.read_csv("s_and_p_500_daily_close_filtered.csv", index_col=0)
-company_sectors = df.iloc[0, :].values
-company_names = df.T.index.values
+data = load_returns("s_and_p_500_daily_close_filtered.csv")
+company_sectors = data.company_sectors
+company_names = data.company_names
 sectors = list(sorted(set(company_sectors)))
 num_sectors = len(sectors)
-df_2 = df.iloc[1:, :]
-df_2 = df_2.apply(pd.to_numeric)
-df_2 = np.log(df_2) - np.log(df_2.shift(1))
-X = df_2.values[1:, :]
+X = data.X
 
-window_size = 300
-slide_size = 30
-no_samples = X.shape[0]
-no_runs = math.floor((no_samples - window_size)/ (slide_size))
-dates = []
-
-for x in range(no_runs):
-    dates.append(df.index[(x+1)*slide_size+window_size][0:10])
-
-dt = pd.to_datetime(dates)
+schedule = WindowSchedule.from_returns(data)
+no_runs = schedule.no_runs
+dt = schedule.dates()
 
 networks_folder = "networks_lw/"
-onlyfiles = [os.path.abspath(os.path.join(networks_folder, f)) for f in os.listdir(networks_folder) if os.path.isfile(os.path.join(networks_folder, f))]
-
-Graphs_partial_correlation = []
-
-# Sort the files into order
-ind = [int(Path(x).stem[23:]) for x in onlyfiles]
-ind = np.argsort(np.array(ind))
-
-for i in ind:
-    f = onlyfiles[i]
-    G = nx.read_graphml(f)
-    Graphs_partial_correlation.append(G)
+matrices_partial_correlation, _ = load_networks(networks_folder)
 
-number_graphs = len(Graphs_partial_correlation)
-number_companies = len(Graphs_partial_correlation[0])
+number_graphs = matrices_partial_correlation.shape[0]
+number_companies = matrices_partial_correlation.shape[1]
 p = number_companies
 
 degree_centrality_par_corr = np.zeros((no_runs, p))
@@ -193,19 +175,20 @@ optimal_portfolio_diff_par_corr = np.zeros(no_runs)
 precision_diag_sum = np.zeros(no_runs)
 
 for i in range(number_graphs):
-    X_new = X[i*slide_size:(i+1)*slide_size+window_size, :]
+    X_new = schedule.window(X, i)
     lw = LedoitWolf()
     lw.fit(X_new)
     prec = lw.precision_
     precision_diag_sum[i] = np.diag(prec).sum()
     optimal_portfolio = (1/ (np.ones(p).T @ prec @ np.ones(p))) * prec @ np.ones(p) 
-    prec = np.array(nx.to_numpy_matrix(Graphs_partial_correlation[i]))
+    prec = np.array(matrices_partial_correlation[i])
 
     degree_centrality_prec = prec.copy()
     degree_centrality = prec.sum(axis=0)
     degree_centrality /= degree_centrality.sum()
 
     optimal_portfolio_diff_par_corr[i] = np.linalg.norm(degree_centrality - optimal_portfolio)
+matrices_partial_correlation.close()
 
 optimal_portfolio_degree_centrality_diff = pd.DataFrame()
 ts = pd.Series(optimal_portfolio_diff_par_corr, index=dt)
@@ -16,6 +16,7 @@ import statsmodels.tsa.stattools
 from sklearn.preprocessing import StandardScaler
 #import modularity_maximizer
 from statsmodels.stats import multitest
+from window_store import load_networks, matrix_to_graph, WindowIndex
 
 def threshold_graph(G):
     M = nx.to_numpy_matrix(G)
@@ -38,21 +39,18 @@ def threshold_graph(G):
 
 # Change this if you wish to analyze either correlation or partial correlation networks
 networks_folder = "partial-graphml/"
-onlyfiles = [os.path.abspath(os.path.join(networks_folder, f)) for f in os.listdir(networks_folder) if os.path.isfile(os.path.join(networks_folder, f))]
-#onlyfiles = onlyfiles[0:1]
-#onlyfiles = list(map(lambda x: os.path.splitext(x)[0], onlyfiles))
-Graphs = []
-
-# Sort the files into order
-ind = [int(Path(x).stem[23:]) for x in onlyfiles]
-ind = np.argsort(np.array(ind))
-
-for i in ind:
-    f = onlyfiles[i]
-    G = nx.read_graphml(f)
-    Graphs.append(G)
-
-number_graphs = len(Graphs)
-
-G = Graphs[0]
+# Set this to a date (e.g. "2008-09-15") to show the network in force on that day instead of the first one
+date = None
+matrices, manifest = load_networks(networks_folder)
+
+number_graphs = matrices.shape[0]
+window = 0
+if date is not None:
+    window_index = WindowIndex.from_manifest(manifest)
+    window = window_index.in_force(date)
+    if window is None:
+        raise ValueError("No network is in force on %s, the first window ends on %s" % (date, window_index.end_dates[0]))
+
+G = matrix_to_graph(matrices[window], manifest['company_names'], manifest['company_sectors'])
+matrices.close()
 threshold_graph(G)
@@ -0,0 +1,86 @@
+import ast
+
+import numpy as np
+
+
+def matrix_to_edges(M):
+    """
+    Returns the non-zero edges of a symmetric network matrix, each once (self loops included)
+    as networkx lists them, as int32 source and target and float32 weight arrays
+    """
+    M = np.asarray(M)
+    rows, cols = np.triu_indices(M.shape[0])
+    weights = M[rows, cols]
+    keep = weights != 0
+    return rows[keep].astype(np.int32), cols[keep].astype(np.int32), weights[keep].astype(np.float32)
+
+
+def write_edges(path, source, target, weight, nodes, compress=False):
+    """
+    Writes an edge list as binary arrays in an .npz file, compressed if compress
+
+    Parameters
+    ----------
+    path : str
+        File to write, .npz is added if missing
+    source, target : array_like
+        Node numbers of the ends of every edge, stored as int32
+    weight : array_like
+        Weight of every edge, stored as float32
+    nodes : array_like
+        Name of every node number
+    compress : bool (optional, default=False)
+        Compress the arrays (zip deflate), smaller but slower to write
+    """
+    save = np.savez_compressed if compress else np.savez
+    save(path, source=np.asarray(source, dtype=np.int32), target=np.asarray(target, dtype=np.int32),
+         weight=np.asarray(weight, dtype=np.float32), nodes=np.asarray(nodes, dtype=str))
+
+
+def write_binary_edgelist(path, M, nodes, compress=False):
+    """
+    Writes the edges of a network matrix as a binary edge list
+    """
+    write_edges(path, *matrix_to_edges(M), nodes, compress)
+
+
+def read_binary_edgelist(path):
+    """
+    Reads a binary edge list
+
+    Returns
+    -------
+    tuple (source, target, weight, nodes)
+    """
+    with np.load(path) as f:
+        return f['source'], f['target'], f['weight'], f['nodes']
+
+
+def binary_to_text(binary_path, text_path):
+    """
+    Converts a binary edge list to the text format of nx.write_edgelist
+    """
+    source, target, weight, nodes = read_binary_edgelist(binary_path)
+    with open(text_path, 'w') as f:
+        for u, v, w in zip(nodes[source], nodes[target], weight.tolist()):
+            f.write("%s %s {'weight': %r}\n" % (u, v, w))
+
+
+def text_to_binary(text_path, binary_path, compress=False):
+    """
+    Converts a text edge list written by nx.write_edgelist to a binary edge list, edges
+    without a weight weigh 1
+    """
+    nodes = {}
+    source, target, weight = [], [], []
+    with open(text_path) as f:
+        for line in f:
+            parts = line.split(None, 2)
+            if len(parts) < 2:
+                continue
+            u, v = parts[0], parts[1]
+            data = ast.literal_eval(parts[2]) if len(parts) > 2 else {}
+            source.append(nodes.setdefault(u, len(nodes)))
+            target.append(nodes.setdefault(v, len(nodes)))
+            weight.append(data.get('weight', 1))
+    write_edges(binary_path, source, target, weight, list(nodes), compress)
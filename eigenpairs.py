@@ -0,0 +1,132 @@
+import hashlib
+import os
+
+import numpy as np
+import scipy.sparse.linalg
+
+from window_store import store_path, store_exists, load_networks, MATRICES_FILE, SPARSE_FILES
+from returns_loader import file_hash
+
+EIGENPAIRS_FILE = "eigenpairs.npz"
+
+
+def leading_eigenpair(M, v0=None, tol=0):
+    """
+    Returns the largest eigenvalue and its eigenvector of a dense or scipy sparse symmetric
+    matrix with Lanczos (eigsh), as a (1,) and a (p, 1) array like scipy.linalg.eigh
+
+    Parameters
+    ----------
+    M : array_like or scipy sparse matrix
+        Symmetric p by p matrix
+    v0 : array_like (optional, default=None)
+        Starting vector, the eigenvector of a neighbouring window converges in a few iterations
+    tol : float (optional, default=0)
+        Relative accuracy of the eigenvalue, 0 is machine precision
+    """
+    if M.shape[0] < 3:
+        # Lanczos needs more dimensions than eigenvectors asked for
+        eigs, eigv = scipy.linalg.eigh(np.asarray(M.todense() if scipy.sparse.issparse(M) else M))
+        return eigs[-1:], eigv[:, -1:]
+    if v0 is not None:
+        v0 = np.asarray(v0, dtype=M.dtype).ravel()
+    return scipy.sparse.linalg.eigsh(M, k=1, which='LA', v0=v0, tol=tol)
+
+
+def leading_eigenpairs(matrices, tol=0):
+    """
+    Leading eigenpair of every window, each solve started from the eigenvector of the window before
+
+    Returns
+    -------
+    tuple (eigenvalues, eigenvectors)
+        (windows,) eigenvalues and (windows, p) eigenvectors
+    """
+    no_windows, p = len(matrices), matrices.shape[1]
+    eigenvalues = np.zeros(no_windows)
+    eigenvectors = np.zeros((no_windows, p))
+    v0 = None
+    for i in range(no_windows):
+        eigs, eigv = leading_eigenpair(matrices[i], v0, tol)
+        eigenvalues[i] = eigs[0]
+        eigenvectors[i] = eigv[:, 0]
+        v0 = eigv
+    return eigenvalues, eigenvectors
+
+
+def eigenvector_diffs(eigenvectors):
+    """
+    Returns the change of the normalised leading eigenvector from every window to the next,
+    as the stages always measured it: the norm of the previous eigenvector as a row minus the
+    current one as a column, a p by p difference
+
+    Parameters
+    ----------
+    eigenvectors : array_like
+        (windows, p) eigenvectors, each normalised to sum to 1
+    Returns
+    -------
+    array_like
+        (windows-1,) changes
+    """
+    return np.array([np.linalg.norm(eigenvectors[i - 1, :] - eigenvectors[i, :, None])
+                     for i in range(1, len(eigenvectors))])
+
+
+def _network_files(networks_folder, sparse):
+    # Store files the windows are read from
+    folder = store_path(networks_folder)
+    if sparse:
+        return [os.path.join(folder, name + '.npy') for name in SPARSE_FILES]
+    return [os.path.join(folder, MATRICES_FILE)]
+
+
+def networks_hash(networks_folder, sparse=False):
+    """
+    Returns the sha1 of the contents of the store files holding the windows of a networks folder
+    """
+    h = hashlib.sha1()
+    for f in _network_files(networks_folder, sparse):
+        h.update(file_hash(f).encode())
+    return h.hexdigest()
+
+
+def load_eigenpairs(networks_folder, matrices=None, sparse=False):
+    """
+    Returns the leading eigenpair of every window of a networks folder, solved once with
+    leading_eigenpairs and saved in its store folder with the hash of the windows they were
+    solved for, later calls read the saved arrays until the windows change
+
+    Folders of GraphML files without a store are solved on every call, nothing is written to them
+
+    Parameters
+    ----------
+    networks_folder : str
+        Folder holding the networks
+    matrices : WindowCollection (optional, default=None)
+        The windows if already loaded, read with load_networks if None
+    sparse : bool (optional, default=False)
+        Use the sparse store, its eigenpairs are saved apart from the dense ones
+    Returns
+    -------
+    tuple (eigenvalues, eigenvectors)
+        (windows,) eigenvalues and (windows, p) eigenvectors
+    """
+    saved = sparse or store_exists(networks_folder)
+    if saved:
+        key = networks_hash(networks_folder, sparse)
+        path = os.path.join(store_path(networks_folder), ('sparse_' if sparse else '') + EIGENPAIRS_FILE)
+        if os.path.isfile(path):
+            with np.load(path) as f:
+                if str(f['key']) == key:
+                    return f['eigenvalues'], f['eigenvectors']
+
+    if matrices is None:
+        with load_networks(networks_folder, sparse=sparse)[0] as matrices:
+            eigenvalues, eigenvectors = leading_eigenpairs(matrices)
+    else:
+        eigenvalues, eigenvectors = leading_eigenpairs(matrices)
+    if not saved:
+        return eigenvalues, eigenvectors
+    np.savez(path, eigenvalues=eigenvalues, eigenvectors=eigenvectors, key=key)
+    return eigenvalues, eigenvectors
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def forward_panel(X, schedule):
+    """
+    Returns the mean return, risk (standard deviation) and Sharpe ratio of every company over
+    the period after every window (schedule.forward_window), for all windows at once
+
+    The rows are gone over once in the segments between consecutive window boundaries, each
+    a view of X, and a window's sums are the difference of the running sums at its stop and
+    start. Only a segment is held in double precision at a time, so memory mapped and single
+    precision returns are not copied whole
+
+    Parameters
+    ----------
+    X : array_like
+        n by p matrix of returns, may be memory mapped, NaN for missing returns
+    schedule : WindowSchedule
+        Windows of the networks
+    Returns
+    -------
+    tuple (returns, risks, sharpe_ratios)
+        (windows, p) arrays, row i aligned with the centralities of window i. As np.mean
+        and np.std, a company missing a return in a period gets NaN for that period
+    """
+    bounds = schedule.forward_bounds()
+    boundaries = np.unique(bounds)
+    p = X.shape[1]
+
+    # Centre on the mean of the first period to keep the cancellation in the differences small
+    with np.errstate(invalid='ignore'):
+        shift = np.nan_to_num(np.nanmean(np.asarray(X[bounds[0, 0]:bounds[0, 1]], dtype=np.float64), axis=0))
+
+    # Running sums of the centred returns, their squares and the missing returns at every boundary
+    s1, s2, missing = (np.zeros((len(boundaries), p)) for _ in range(3))
+    for k in range(1, len(boundaries)):
+        Y = np.asarray(X[boundaries[k - 1]:boundaries[k]], dtype=np.float64) - shift
+        segment_missing = np.isnan(Y)
+        Y[segment_missing] = 0
+        s1[k] = s1[k - 1] + Y.sum(axis=0)
+        s2[k] = s2[k - 1] + (Y * Y).sum(axis=0)
+        missing[k] = missing[k - 1] + segment_missing.sum(axis=0)
+
+    starts = np.searchsorted(boundaries, bounds[:, 0])
+    stops = np.searchsorted(boundaries, bounds[:, 1])
+    lengths = (bounds[:, 1] - bounds[:, 0])[:, None]
+    centred = (s1[stops] - s1[starts]) / lengths
+    returns = centred + shift
+    risks = np.sqrt(np.maximum((s2[stops] - s2[starts]) / lengths - centred * centred, 0))
+    incomplete = (missing[stops] - missing[starts]) > 0
+    returns[incomplete] = np.nan
+    risks[incomplete] = np.nan
+
+    with np.errstate(divide='warn', invalid='warn'):
+        sharpe_ratios = np.divide(returns, risks)
+    return returns, risks, sharpe_ratios
@@ -0,0 +1,118 @@
+import warnings
+
+import numpy as np
+import scipy.linalg
+from sklearn.exceptions import ConvergenceWarning
+
+
+def soft_threshold_offdiagonal(A, threshold):
+    """
+    Soft thresholds the off-diagonal entries of A, leaving the diagonal alone
+    """
+    Z = np.sign(A) * np.maximum(np.abs(A) - threshold, 0)
+    np.fill_diagonal(Z, np.diag(A))
+    return Z
+
+
+def graphical_lasso_admm(S, alpha, precision_init=None, covariance_init=None, rho=1.0, tol=1e-6, max_iter=1000):
+    """
+    Solves the graphical lasso (off-diagonal l1 penalty, as sklearn) with ADMM, which can be
+    warm started from the precision and covariance of a nearby problem
+
+    Parameters
+    ----------
+    S : array_like
+        p by p sample covariance
+    alpha : float
+        Regularization parameter
+    precision_init : array_like (optional, default=None)
+        Starting precision, e.g. the solution of the previous window
+    covariance_init : array_like (optional, default=None)
+        Starting covariance, sets the starting dual variable (covariance_init - S)/rho
+    rho : float (optional, default=1.0)
+        ADMM penalty parameter
+    tol : float (optional, default=1e-6)
+        Relative tolerance on the primal and dual residuals
+    max_iter : int (optional, default=1000)
+        Maximum number of ADMM iterations, a ConvergenceWarning is raised if tol isn't reached
+    Returns
+    -------
+    tuple (precision, covariance, n_iter)
+        precision is exactly sparse, covariance the inverse of its dense counterpart
+    """
+    p = S.shape[0]
+    if precision_init is None:
+        Z = np.diag(1 / np.diag(S))
+    else:
+        Z = precision_init.copy()
+    if covariance_init is None:
+        U = np.zeros_like(S)
+    else:
+        # At the optimum the scaled dual is (inv(precision) - S)/rho
+        U = (covariance_init - S) / rho
+
+    # Tiny entries shrinking to zero are expected, don't let them trip np.seterr(all='raise')
+    with np.errstate(under='ignore'):
+        for n_iter in range(1, max_iter + 1):
+            # Precision step: rho*Theta - inv(Theta) = rho*(Z - U) - S, solved in the eigenbasis
+            lam, Q = scipy.linalg.eigh(rho * (Z - U) - S)
+            theta = (lam + np.sqrt(lam ** 2 + 4 * rho)) / (2 * rho)
+            Theta = (Q * theta) @ Q.T
+
+            Z_old = Z
+            Z = soft_threshold_offdiagonal(Theta + U, alpha / rho)
+            U = U + Theta - Z
+
+            primal = np.linalg.norm(Theta - Z)
+            dual = rho * np.linalg.norm(Z - Z_old)
+            if primal <= tol * max(np.linalg.norm(Theta), np.linalg.norm(Z)) and dual <= tol * rho * np.linalg.norm(U):
+                break
+        else:
+            warnings.warn("graphical_lasso_admm did not converge in %d iterations (alpha=%s)" % (max_iter, alpha),
+                          ConvergenceWarning)
+
+    covariance = (Q / theta) @ Q.T
+    return Z, covariance, n_iter
+
+
+class WarmStartedGraphicalLasso:
+    """
+    Fits the graphical lasso over a sequence of overlapping windows, and for a path of
+    regularization parameters, starting every solve from the closest earlier solution
+    """
+
+    def __init__(self, alphas, rho=1.0, tol=1e-6, max_iter=1000):
+        """
+        Parameters
+        ----------
+        alphas : list
+            Regularization parameters fitted for every window
+        rho, tol, max_iter :
+            Passed on to graphical_lasso_admm
+        """
+        self.alphas = list(alphas)
+        self.rho = rho
+        self.tol = tol
+        self.max_iter = max_iter
+        self.solutions = {}
+        self.n_iter = {}
+
+    def fit(self, S):
+        """
+        Fits the window with sample covariance S for every alpha
+
+        Each alpha starts from its solution of the previous window, or for the first window
+        from the solution of the next larger alpha on the path
+
+        Returns
+        -------
+        list of tuples (precision, covariance), one per alpha in the order given
+        """
+        previous = None
+        for alpha in sorted(self.alphas, reverse=True):
+            precision_init, covariance_init = self.solutions.get(alpha, previous or (None, None))
+            precision, covariance, n_iter = graphical_lasso_admm(S, alpha, precision_init, covariance_init,
+                                                                 self.rho, self.tol, self.max_iter)
+            self.solutions[alpha] = previous = (precision, covariance)
+            self.n_iter[alpha] = n_iter
+        return [self.solutions[alpha] for alpha in self.alphas]
@@ -0,0 +1,145 @@
+import os
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def _local(tag):
+    # Drops the GraphML namespace from a tag
+    return tag.rsplit('}', 1)[-1]
+
+
+def read_graphml_matrix(path, nodelist=None, dtype=np.float64, weight='weight'):
+    """
+    Reads the weighted adjacency matrix of an undirected GraphML network without building
+    a networkx graph, the edges are parsed one at a time straight into the matrix
+
+    Parameters
+    ----------
+    path : str
+        GraphML file
+    nodelist : list (optional, default=None)
+        Order of the nodes in the matrix, the order of the file if None
+    dtype : numpy dtype (optional, default=np.float64)
+        Type of the matrix
+    weight : str (optional, default='weight')
+        Edge attribute holding the weights, edges without it weigh 1 as in networkx
+    Returns
+    -------
+    tuple (M, nodes, attributes)
+        M is the p by p matrix (as nx.to_numpy_array would give), nodes the node ids in
+        its order and attributes a dict from each node attribute name to its values in that order
+    """
+    keys = {}
+    nodes = []
+    node_data = []
+    index = None
+    M = None
+    if nodelist is not None:
+        nodelist = [str(n) for n in nodelist]
+        index = {n: i for i, n in enumerate(nodelist)}
+        M = np.zeros((len(nodelist), len(nodelist)), dtype=dtype)
+
+    graph = None
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        tag = _local(elem.tag)
+        if event == 'start':
+            # Parsed nodes and edges are removed from the graph, clearing them would leave them attached
+            if tag == 'graph':
+                graph = elem
+            continue
+        if tag == 'key':
+            keys[elem.get('id')] = (elem.get('for'), elem.get('attr.name'), elem.get('attr.type'))
+        elif tag == 'node':
+            nodes.append(elem.get('id'))
+            node_data.append({keys[d.get('key')][1]: d.text for d in elem if _local(d.tag) == 'data'})
+            del graph[:]
+        elif tag == 'edge':
+            if M is None:
+                # Every node comes before the edges in files written by networkx
+                index = {n: i for i, n in enumerate(nodes)}
+                M = np.zeros((len(nodes), len(nodes)), dtype=dtype)
+            w = 1.0
+            for d in elem:
+                if _local(d.tag) == 'data' and keys[d.get('key')][1] == weight:
+                    w = float(d.text)
+            i, j = index[elem.get('source')], index[elem.get('target')]
+            M[i, j] = w
+            M[j, i] = w
+            del graph[:]
+
+    if nodelist is None:
+        nodelist = nodes
+    if M is None:
+        M = np.zeros((len(nodelist), len(nodelist)), dtype=dtype)
+
+    data = dict(zip(nodes, node_data))
+    names = sorted({name for d in node_data for name in d})
+    attributes = {name: [data.get(n, {}).get(name) for n in nodelist] for name in names}
+    return M, nodelist, attributes
+
+
+def _read_matrix(task):
+    path, nodelist, dtype = task
+    return read_graphml_matrix(path, nodelist, dtype)[0]
+
+
+def iter_graphml_matrices(paths, nodelist, dtype=np.float64, workers=None):
+    """
+    Yields the matrix of every GraphML file in order, parsed in a process pool that only runs
+    a couple of files per process ahead of the caller, so at most that many matrices are held
+
+    Parameters
+    ----------
+    paths : list
+        GraphML files, one per window
+    nodelist : list
+        Order of the nodes in the matrices
+    dtype : numpy dtype (optional, default=np.float64)
+        Type of the matrices
+    workers : int (optional, default=None)
+        Number of processes, as many as cores if None and 1 to read in this process
+    """
+    tasks = ((path, nodelist, dtype) for path in paths)
+    if workers == 1:
+        yield from map(_read_matrix, tasks)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_read_matrix, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_graphml_matrices(paths, nodelist=None, dtype=np.float64, workers=None):
+    """
+    Reads many GraphML networks into a (len(paths), p, p) array with read_graphml_matrix,
+    spread over a process pool
+
+    Parameters
+    ----------
+    paths : list
+        GraphML files, one per window
+    nodelist : list (optional, default=None)
+        Order of the nodes, the order of the first file if None
+    dtype : numpy dtype (optional, default=np.float64)
+        Type of the matrices
+    workers : int (optional, default=None)
+        Number of processes, as many as cores if None and 1 to read in this process
+    Returns
+    -------
+    tuple (matrices, nodes, attributes)
+        As read_graphml_matrix, the node attributes taken from the first file
+    """
+    first, nodelist, attributes = read_graphml_matrix(paths[0], nodelist, dtype)
+    matrices = np.empty((len(paths),) + first.shape, dtype=dtype)
+    matrices[0] = first
+    for i, M in enumerate(iter_graphml_matrices(paths[1:], nodelist, dtype, workers), start=1):
+        matrices[i] = M
+    return matrices, nodelist, attributes
@@ -4,151 +4,463 @@ import math
 import networkx as nx
 from sklearn.preprocessing import StandardScaler
 import os
-from sklearn.covariance import LedoitWolf
+from sklearn.covariance import LedoitWolf, shrunk_covariance
 import matplotlib.pyplot as plt
 from os import makedirs
+from rolling_covariance import RollingCovariance, window_statistics, standardized_statistics, prefix_window_sums
+from spectral_shrinkage import SpectralShrinkage
+from graphical_lasso import WarmStartedGraphicalLasso
+from window_schedule import WindowSchedule
+from window_store import create_store, open_store, update_manifest, matrix_to_graph, write_sparse_store
+from sparsify import sparsify, check_sparsify
+from edge_list import write_binary_edgelist
+from masked_covariance import pairwise_standardized_statistics, nearest_psd
+from scipy.linalg import pinvh
+from concurrent.futures import ProcessPoolExecutor
+from streaming_histogram import StreamingHistogram
+from returns_loader import load_returns
+
+ESTIMATORS = ('ledoit_wolf', 'spectral', 'graphical_lasso', 'pairwise')
+
+def precision_matrices_to_partial_corr(theta):
+    """
+    Turns a precision matrix, or a stack of them with shape (windows, p, p),
+    into partial correlation matrices by scaling with the outer product of the diagonal
+    """
+    theta = np.asarray(theta)
+    d = np.diagonal(theta, axis1=-2, axis2=-1)
+    partial_corr = -theta / np.sqrt(d[..., :, None] * d[..., None, :])
+    idx = np.arange(theta.shape[-1])
+    partial_corr[..., idx, idx] = 1
+    return partial_corr
+
+def covariance_matrices_to_corr(cov):
+    """
+    Turns a covariance matrix, or a stack of them with shape (windows, p, p),
+    into correlation matrices by scaling with the outer product of the diagonal
+    """
+    cov = np.asarray(cov)
+    d = np.diagonal(cov, axis1=-2, axis2=-1)
+    corr = cov / np.sqrt(d[..., :, None] * d[..., None, :])
+    idx = np.arange(cov.shape[-1])
+    corr[..., idx, idx] = 1
+    return corr
 
 def precision_matrix_to_partial_corr(theta):
     """
     Turns a precision matrix into a partial correlation one
     """
-    p = theta.shape[0]
-    partial_corr = np.zeros((p, p))
-    for i in range(p):
-        for j in range(p):
-            partial_corr[i, j] = -theta[i, j] / np.sqrt(theta[i, i] * theta[j, j])
-    np.fill_diagonal(partial_corr, 1)
-    return partial_corr
+    return precision_matrices_to_partial_corr(theta)
 
 def covariance_matrix_to_corr(cov):
     """
     Turns a covariance matrix into a correlation one
     """
-    p = cov.shape[0]
-    corr = np.zeros((p, p))
-    for i in range(p):
-        for j in range(p):
-            corr[i, j] = cov[i, j] / np.sqrt(cov[i, i] * cov[j, j])
-    np.fill_diagonal(corr, 1)
-    return corr
+    return covariance_matrices_to_corr(cov)
 
+def fit_window(X_new):
+    """
+    Standardizes a window of returns and fits a Ledoit-Wolf estimator to it,
+    returns the shrunk covariance, precision and shrinkage
+    """
+    ss = StandardScaler()
+    X_new = ss.fit_transform(X_new)
 
-def run(**params):
-    np.seterr(all='raise')
+    lw = LedoitWolf()
+    lw.fit(X_new)
+    return lw.covariance_, lw.precision_, lw.shrinkage_
 
-    df = pd.read_csv(params["input_name"], index_col=0)
+def fit_window_pairwise(X_new):
+    """
+    Same as fit_window for a window with missing returns: the standardized covariance is
+    taken over the rows where both companies are present and projected onto the positive
+    semidefinite matrices before shrinking
+    """
+    S, shrinkage, _ = pairwise_standardized_statistics(X_new)
+    cov = shrunk_covariance(nearest_psd(S), shrinkage)
+    return cov, pinvh(cov), shrinkage
 
-    company_sectors = df.iloc[0, :].values
-    company_names = df.T.index.values
-    sectors = list(sorted(set(company_sectors)))
-    df_2 = df.iloc[1:, :]
-    df_2 = df_2.apply(pd.to_numeric)
-    df_2 = np.log(df_2) - np.log(df_2.shift(1))
-    X = df_2.values[1:, :]
+def fit_window_incremental(rolling, start, stop):
+    """
+    Same as fit_window but slides a RollingCovariance to rows [start, stop)
+    instead of refitting the window from scratch
+    """
+    rolling.move_to(start, stop)
+    S, shrinkage = rolling.statistics()
+    cov = shrunk_covariance(S, shrinkage)
+    return cov, pinvh(cov), shrinkage
+
+def fit_window_spectral(X, start, stop, rolling=None, shrinkage_grid=None):
+    """
+    Fits the Ledoit-Wolf estimator to rows [start, stop) of X with a single eigendecomposition,
+    returns the shrunk covariance, precision and shrinkage, and if a grid of shrinkage
+    intensities is given the stacked covariances and precisions for each of them
+    """
+    if rolling is None:
+        S, shrinkage = window_statistics(X[start:stop, :])
+    else:
+        rolling.move_to(start, stop)
+        S, shrinkage = rolling.statistics()
+
+    spectral = SpectralShrinkage(S)
+    cov, prec = spectral.covariance(shrinkage), spectral.precision(shrinkage)
+    if shrinkage_grid is None:
+        return cov, prec, shrinkage, None, None
+    return cov, prec, shrinkage, spectral.covariance(shrinkage_grid), spectral.precision(shrinkage_grid)
+
+def fit_window_graphical_lasso(X, start, stop, glasso, rolling=None):
+    """
+    Fits the graphical lasso to the standardized rows [start, stop) of X for every alpha of
+    glasso, warm started from the previous window, returns the (precision, covariance) per alpha
+    """
+    if rolling is None:
+        S, _ = window_statistics(X[start:stop, :])
+    else:
+        rolling.move_to(start, stop)
+        S, _ = rolling.statistics()
+    return glasso.fit(S)
+
+def sparsify_window(M, method, value, window_bounds, n_conditioning):
+    """
+    Sparsifies a window's network, the significance test also needs the window length and
+    the number of variables partialled out (0 for correlations)
+    """
+    if method == 'significance':
+        start, stop = window_bounds
+        return sparsify(M, method, value, n_samples=stop - start, n_conditioning=n_conditioning)
+    return sparsify(M, method, value)
+
+def sweep_folder(networks_folder, name, value):
+    """
+    Returns the folder holding the networks of a sweep (e.g. over the shrinkage) for one value
+    """
+    return networks_folder + "%s_sweep/%s_%s/" % (name, name, value)
+
+def export_window(M, company_names, company_sectors, folder, graphml_name, edgelist_name, compress_edgelists=False):
+    """
+    Writes a window's network as GraphML and as a binary edgelist for use outside of the pipeline (e.g. Gephi),
+    edge_list.binary_to_text turns the edgelist into the text format of nx.write_edgelist
+    """
+    G = matrix_to_graph(M, company_names, company_sectors)
+    nx.write_graphml(G, folder + graphml_name)
+    makedirs(folder + "edgelists/", exist_ok=True)
+    write_binary_edgelist(folder + "edgelists/" + edgelist_name, M, company_names, compress_edgelists)
+
+def estimate_windows(X, bounds, windows, cor_dir, pcor_dir, estimator='ledoit_wolf', incremental=False,
+                     shrinkage_grid=None, alpha=0.1, alpha_grid=None, company_names=None, company_sectors=None,
+                     compress_edgelists=False):
+    """
+    Estimates the correlation and partial correlation networks of the windows given by their
+    row bounds and writes them into the window stores, returns the shrinkage of each window
+    (None for the graphical lasso, which has no shrinkage intensity)
 
+    Parameters
+    ----------
+    X : array_like
+        n by p matrix of returns
+    bounds : list
+        (start, stop) rows of each window
+    windows : list
+        Index of each window in the stores
+    cor_dir, pcor_dir : str
+        Folders holding the correlation and partial correlation stores
+    estimator : str (optional, default='ledoit_wolf')
+        'ledoit_wolf' for sklearn's estimator, 'spectral' for one eigendecomposition per window
+        'graphical_lasso' for sparse networks or 'pairwise' for returns with missing values
+    incremental : bool (optional, default=False)
+        Slide a RollingCovariance over the windows instead of refitting each one
+    shrinkage_grid : list (optional, default=None)
+        Shrinkage intensities to also write networks for, only with the spectral estimator
+    alpha : float (optional, default=0.1)
+        Regularization of the graphical lasso
+    alpha_grid : list (optional, default=None)
+        Graphical lasso regularizations to also write networks for
+    company_names : array_like (optional, default=None)
+        If given the windows are also exported as GraphML and edgelists
+    company_sectors : array_like (optional, default=None)
+        Sector of each company, needed for the export
+    compress_edgelists : bool (optional, default=False)
+        Compress the exported binary edgelists
+    """
+    np.seterr(all='raise')
+    corr_store, _ = open_store(cor_dir, mode='r+')
+    pcor_store, _ = open_store(pcor_dir, mode='r+')
+    if shrinkage_grid is not None:
+        sweep_name, sweep_values = 'shrinkage', shrinkage_grid
+    else:
+        sweep_name, sweep_values = 'alpha', alpha_grid
+    if sweep_values is not None:
+        sweep_stores = [(open_store(sweep_folder(cor_dir, sweep_name, s), mode='r+')[0], open_store(sweep_folder(pcor_dir, sweep_name, s), mode='r+')[0])
+                        for s in sweep_values]
+    rolling = RollingCovariance(X) if incremental else None
+    # Carries the solutions from one window to the next for the warm starts
+    glasso = WarmStartedGraphicalLasso([alpha] + list(alpha_grid or [])) if estimator == 'graphical_lasso' else None
     shrinkages = []
 
-    window_size = 300
-    slide_size = 30
-    no_samples = X.shape[0]
-    p = X.shape[1]
-    no_runs = math.floor((no_samples - window_size) / (slide_size))
-    print("We're running %s times" % no_runs)
+    for (start, stop), x in zip(bounds, windows):
+        print("Run %s" % x)
+        if estimator == 'spectral':
+            cov, prec, shrinkage, sweep_covs, sweep_precs = fit_window_spectral(X, start, stop, rolling, shrinkage_grid)
+        elif estimator == 'graphical_lasso':
+            solutions = fit_window_graphical_lasso(X, start, stop, glasso, rolling)
+            prec, cov = solutions[0]
+            # The L1 penalty is no shrinkage intensity, it goes in the manifest as alpha
+            shrinkage = None
+            if alpha_grid is not None:
+                sweep_covs = np.array([c for _, c in solutions[1:]])
+                sweep_precs = np.array([s for s, _ in solutions[1:]])
+        elif estimator == 'pairwise':
+            cov, prec, shrinkage = fit_window_pairwise(X[start:stop, :])
+        elif rolling is None:
+            cov, prec, shrinkage = fit_window(X[start:stop, :])
+        else:
+            cov, prec, shrinkage = fit_window_incremental(rolling, start, stop)
 
-    X_new = X[0:window_size, :]
-    ss = StandardScaler()
-    X_new = ss.fit_transform(X_new)
+        shrinkages.append(shrinkage)
+        corr = covariance_matrix_to_corr(cov)
+        prec = precision_matrix_to_partial_corr(prec)
 
-    lw = LedoitWolf()
-    lw.fit(X_new)
-    shrinkages.append(lw.shrinkage_)
+        corr_store[x] = corr
+        pcor_store[x] = prec
+        if company_names is not None:
+            export_window(corr, company_names, company_sectors, cor_dir, "network_over_time_corr_%s.graphml" % x, "network_over_time_pecorr_%s.npz" % x, compress_edgelists)
+            export_window(prec, company_names, company_sectors, pcor_dir, "network_over_time_prec_%s.graphml" % x, "network_over_time_pacorr_%s.npz" % x, compress_edgelists)
 
-    corr = lw.covariance_
+        if sweep_values is not None:
+            sweep_corrs = covariance_matrices_to_corr(sweep_covs)
+            sweep_par_corrs = precision_matrices_to_partial_corr(sweep_precs)
+            for (sweep_corr_store, sweep_pcor_store), sweep_corr, sweep_par_corr in zip(sweep_stores, sweep_corrs, sweep_par_corrs):
+                sweep_corr_store[x] = sweep_corr
+                sweep_pcor_store[x] = sweep_par_corr
+
+    corr_store.flush()
+    pcor_store.flush()
+    if sweep_values is not None:
+        for sweep_corr_store, sweep_pcor_store in sweep_stores:
+            sweep_corr_store.flush()
+            sweep_pcor_store.flush()
+    return shrinkages
+
+def estimate_window_grid(X, schedules, cor_dirs, pcor_dirs):
+    """
+    Estimates the Ledoit-Wolf networks of several window schedules (e.g. different window
+    and slide sizes) in one pass over the returns, each window's standardized covariance
+    coming from the difference of two prefix moment sums, and writes them into the stores
+    of each schedule, returns the shrinkages of each schedule
+
+    Parameters
+    ----------
+    X : array_like
+        n by p matrix of returns
+    schedules : list
+        WindowSchedule of each configuration
+    cor_dirs, pcor_dirs : list
+        Folders holding the correlation and partial correlation stores of each schedule
+    """
+    np.seterr(all='raise')
+    stores = [(open_store(cor_dir, mode='r+')[0], open_store(pcor_dir, mode='r+')[0]) for cor_dir, pcor_dir in zip(cor_dirs, pcor_dirs)]
+    # All windows of all schedules, remembering which schedule and window each one is
+    bounds = [tuple(b) for schedule in schedules for b in schedule.bounds]
+    owners = [(k, x) for k, schedule in enumerate(schedules) for x in range(schedule.no_runs)]
+    shrinkages = [np.zeros(schedule.no_runs) for schedule in schedules]
+
+    for i, sums in prefix_window_sums(X, bounds):
+        k, x = owners[i]
+        S, shrinkage = standardized_statistics(*sums)
+        cov = shrunk_covariance(S, shrinkage)
+        corr_store, pcor_store = stores[k]
+        corr_store[x] = covariance_matrix_to_corr(cov)
+        pcor_store[x] = precision_matrix_to_partial_corr(pinvh(cov))
+        shrinkages[k][x] = shrinkage
+
+    for corr_store, pcor_store in stores:
+        corr_store.flush()
+        pcor_store.flush()
+    return shrinkages
+
+_worker_X = None
+
+def init_worker(X, threads):
+    """
+    Sets up a process pool worker: keeps its copy of the returns and limits
+    its BLAS threads so the workers together don't oversubscribe the cores,
+    memory mapped returns are passed by file name and mapped again by the worker
+    """
+    global _worker_X
+    if isinstance(X, str):
+        X = np.load(X, mmap_mode='r')
+    _worker_X = X
+    for var in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']:
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+def estimate_windows_worker(task):
+    """
+    Runs estimate_windows in a process pool worker on the returns given to init_worker
+    """
+    bounds, windows, options = task
+    return estimate_windows(_worker_X, bounds, windows, **options)
+
+
+def run(**params):
+    np.seterr(all='raise')
+
+    # float32 halves the memory and bandwidth of the returns and the stores, see the README for its tolerances
+    dtype = np.dtype(params.get('dtype', np.float64))
+    data = load_returns(params["input_name"], params.get('cache_dir'), dtype=dtype, mmap=params.get('mmap', False))
+
+    company_sectors = data.company_sectors
+    company_names = data.company_names
+    sectors = list(sorted(set(company_sectors)))
+    X = data.X
+
+    window_size = params.get('window_size', 300)
+    slide_size = params.get('slide_size', 30)
+    workers = params.get('workers', 1)
+    incremental = params.get('incremental', False)
+    estimator = params.get('estimator', 'ledoit_wolf')
+    shrinkage_grid = params.get('shrinkage_grid')
+    alpha = params.get('alpha', 0.1)
+    alpha_grid = params.get('alpha_grid')
+    export_graphml = params.get('export_graphml', False)
+    packed = params.get('packed', False)
+    window_grid = params.get('window_grid')
+    if estimator not in ESTIMATORS:
+        raise ValueError("Unknown estimator %r, expected one of %s" % (estimator, ", ".join(ESTIMATORS)))
+    if incremental and estimator == 'pairwise':
+        raise ValueError("The pairwise estimator can't slide a rolling covariance, it needs incremental=False")
+    if shrinkage_grid is not None and estimator != 'spectral':
+        raise ValueError("A shrinkage grid needs the spectral estimator")
+    if alpha_grid is not None and estimator != 'graphical_lasso':
+        raise ValueError("An alpha grid needs the graphical lasso estimator")
+    # Summing is a cheap pass over (possibly memory mapped) returns as any NaN carries through
+    if np.isnan(X.sum()) and (estimator != 'pairwise' or window_grid is not None):
+        raise ValueError("The returns have missing values, which only the pairwise estimator handles")
+    p = X.shape[1]
+    schedule = WindowSchedule.from_returns(data, window_size, slide_size)
+    no_runs = schedule.no_runs
+    sparsify_method = params.get('sparsify')
+    if sparsify_method is not None:
+        # The partial correlations condition on the other p - 2 companies, check the shortest window
+        # can be tested before any network is estimated
+        check_sparsify(sparsify_method, params.get('sparsify_value'), int(schedule.lengths.min()), p - 2)
+    print("We're running %s times" % no_runs)
 
-    prec = lw.precision_
-    corr = covariance_matrix_to_corr(corr)
-    prec = precision_matrix_to_partial_corr(prec)
-    l=0
-    
     os.makedirs(params['cor_dir'], exist_ok=True)
     os.makedirs(params['pcor_dir'], exist_ok=True)
 
-    G=nx.from_numpy_matrix(corr)
-    G=nx.relabel_nodes(G, dict(zip(G.nodes(), company_names)))
-    node_attributes = dict(zip(company_names[list(range(len(company_sectors)))], company_sectors))
-    nx.set_node_attributes(G, node_attributes, 'sector')
-    G.graph['l'] = l
-    nx.write_graphml(G, params['cor_dir'] + "network_over_time_corr_%s.graphml" % 0)
-    makedirs(params['cor_dir'] + "edgelists/", exist_ok=True)
-    nx.write_edgelist(G, params['cor_dir'] + "edgelists/" + "network_over_time_pecorr_%s.txt" % 0)
-    print("%s non-zero values" % np.count_nonzero(prec))
-    
-    np.save(params['workdir'] + "prec_0", prec)
-
-    G=nx.from_numpy_matrix(prec)
-    G=nx.relabel_nodes(G, dict(zip(G.nodes(), company_names)))
-    node_attributes = dict(zip(company_names[list(range(len(company_sectors)))], company_sectors))
-    nx.set_node_attributes(G, node_attributes, 'sector')
-    G.graph['l'] = l
-    nx.write_graphml(G, params['pcor_dir'] + "network_over_time_prec_%s.graphml" % 0)
-    makedirs(params['pcor_dir'] + "edgelists/", exist_ok=True)
-    nx.write_edgelist(G, params['pcor_dir'] + "edgelists/" + "network_over_time_pacorr_%s.txt" % 0)
-
-    par_corr_values = []
-    corr_values = []
-
-    corr_values.append(corr.flatten())
-    par_corr_values.append(prec.flatten())
-    prev_prec = prec.copy()
-
-    for x in range(1, no_runs):
-        print("Run %s" % x)
-        X_new = X[x*slide_size:(x+1)*slide_size+window_size, :]
+    bounds = schedule.bounds
+    manifest = {
+        'company_names': list(company_names),
+        'company_sectors': list(company_sectors),
+        'start_dates': schedule.start_dates.tolist(),
+        'end_dates': schedule.end_dates.tolist(),
+        'window_size': window_size,
+        'slide_size': slide_size,
+        'estimator': estimator,
+    }
+    if estimator == 'graphical_lasso':
+        manifest['alpha'] = alpha
+    create_store(params['cor_dir'], no_runs, p, dict(manifest, network_type='corr'), dtype=dtype, packed=packed).flush()
+    create_store(params['pcor_dir'], no_runs, p, dict(manifest, network_type='par_corr'), dtype=dtype, packed=packed).flush()
+    for name, values in [('shrinkage', shrinkage_grid), ('alpha', alpha_grid)]:
+        for s in values or []:
+            create_store(sweep_folder(params['cor_dir'], name, s), no_runs, p, dict(manifest, network_type='corr', **{name: s}), dtype=dtype, packed=packed).flush()
+            create_store(sweep_folder(params['pcor_dir'], name, s), no_runs, p, dict(manifest, network_type='par_corr', **{name: s}), dtype=dtype, packed=packed).flush()
 
-        ss = StandardScaler()
-        X_new = ss.fit_transform(X_new)
+    # Contiguous chunks so the incremental estimator only rescans one window per chunk,
+    # a few per worker to balance the load
+    no_chunks = min(no_runs, workers * 4) if workers > 1 else 1
+    chunks = [list(c) for c in np.array_split(np.arange(no_runs), no_chunks)]
+    options = {
+        'cor_dir': params['cor_dir'],
+        'pcor_dir': params['pcor_dir'],
+        'estimator': estimator,
+        'incremental': incremental,
+        'shrinkage_grid': shrinkage_grid,
+        'alpha': alpha,
+        'alpha_grid': alpha_grid,
+        'company_names': company_names if export_graphml else None,
+        'company_sectors': company_sectors,
+        'compress_edgelists': params.get('compress_edgelists', False),
+    }
+    tasks = [([bounds[x] for x in chunk], chunk, options) for chunk in chunks]
 
-        lw = LedoitWolf()
-        lw.fit(X_new)
+    if workers > 1:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(X.filename if isinstance(X, np.memmap) else X, threads)) as pool:
+            results = list(pool.map(estimate_windows_worker, tasks))
+    else:
+        results = [estimate_windows(X, task_bounds, task_windows, **task_options) for task_bounds, task_windows, task_options in tasks]
+    shrinkages = [s for chunk_shrinkages in results for s in chunk_shrinkages]
 
-        shrinkages.append(lw.shrinkage_)
-        corr = covariance_matrix_to_corr(lw.covariance_)
+    corr_store, _ = open_store(params['cor_dir'])
+    pcor_store, _ = open_store(params['pcor_dir'])
+    if estimator != 'graphical_lasso':
+        update_manifest(params['cor_dir'], shrinkages=[float(s) for s in shrinkages])
+        update_manifest(params['pcor_dir'], shrinkages=[float(s) for s in shrinkages])
+    if export_graphml:
+        # Lets the analyses find the GraphML file of every window without listing the folder
+        update_manifest(params['cor_dir'], graphml_files=["network_over_time_corr_%s.graphml" % x for x in range(no_runs)])
+        update_manifest(params['pcor_dir'], graphml_files=["network_over_time_prec_%s.graphml" % x for x in range(no_runs)])
 
-        prec = lw.precision_
-        prec = precision_matrix_to_partial_corr(prec)
+    if window_grid is not None:
+        # Networks for every (window_size, slide_size) of the grid from one pass over the returns
+        schedules = [WindowSchedule.from_returns(data, w, s) for w, s in window_grid]
+        grid_dirs = []
+        for schedule in schedules:
+            value = "%s_%s" % (schedule.window_size, schedule.slide_size)
+            grid_manifest = dict(manifest, start_dates=schedule.start_dates.tolist(), end_dates=schedule.end_dates.tolist(),
+                                 window_size=schedule.window_size, slide_size=schedule.slide_size, estimator='ledoit_wolf')
+            grid_manifest.pop('alpha', None)
+            grid_dirs.append((sweep_folder(params['cor_dir'], 'window', value), sweep_folder(params['pcor_dir'], 'window', value)))
+            create_store(grid_dirs[-1][0], schedule.no_runs, p, dict(grid_manifest, network_type='corr'), dtype=dtype, packed=packed).flush()
+            create_store(grid_dirs[-1][1], schedule.no_runs, p, dict(grid_manifest, network_type='par_corr'), dtype=dtype, packed=packed).flush()
+        grid_shrinkages = estimate_window_grid(X, schedules, [c for c, _ in grid_dirs], [pc for _, pc in grid_dirs])
+        for (grid_cor_dir, grid_pcor_dir), grid_shrinkage in zip(grid_dirs, grid_shrinkages):
+            update_manifest(grid_cor_dir, shrinkages=grid_shrinkage.tolist())
+            update_manifest(grid_pcor_dir, shrinkages=grid_shrinkage.tolist())
+
+    if sparsify_method is not None:
+        sparsify_value = params['sparsify_value']
+        # Stream the dense windows through the sparsifier, only the CSR arrays are kept in memory
+        for folder, store, n_conditioning in [(params['cor_dir'], corr_store, 0), (params['pcor_dir'], pcor_store, p - 2)]:
+            sparse_matrices = (sparsify_window(store[x], sparsify_method, sparsify_value, bounds[x], n_conditioning) for x in range(no_runs))
+            write_sparse_store(folder, sparse_matrices, sparsify_method, sparsify_value)
 
-        corr_values.append(corr.flatten())
-        par_corr_values.append(prec.flatten())
-        G=nx.from_numpy_matrix(corr)
-        G=nx.relabel_nodes(G, dict(zip(G.nodes(), company_names)))
-        node_attributes = dict(zip(company_names[list(range(len(company_sectors)))], company_sectors))
-        nx.set_node_attributes(G, node_attributes, 'sector')
-        nx.write_graphml(G, params['cor_dir'] + "network_over_time_corr_%s.graphml" % x)
-        nx.write_edgelist(G, params['cor_dir'] + "edgelists/" + "network_over_time_pecorr_%s.txt" % x)
-
-        G=nx.from_numpy_matrix(prec)
-        G=nx.relabel_nodes(G, dict(zip(G.nodes(), company_names)))
-        node_attributes = dict(zip(company_names[list(range(len(company_sectors)))], company_sectors))
-        nx.set_node_attributes(G, node_attributes, 'sector')
-        nx.write_graphml(G, params['pcor_dir'] + "network_over_time_prec_%s.graphml" % x)
-        nx.write_edgelist(G, params['pcor_dir'] + "edgelists/" + "network_over_time_pacorr_%s.txt" % x)
+    print("%s non-zero values" % np.count_nonzero(pcor_store[0]))
+    np.save(params['workdir'] + "prec_0", pcor_store[0])
+
+    # Stream the windows through fixed bin histograms instead of keeping every edge weight
+    corr_values = StreamingHistogram(bins=100, range=(-1, 1))
+    par_corr_values = StreamingHistogram(bins=100, range=(-1, 1))
+    for x in range(no_runs):
+        corr_values.update(corr_store[x])
+        par_corr_values.update(pcor_store[x])
+    corr_values.save(params['workdir'] + "correlation_values")
+    par_corr_values.save(params['workdir'] + "partial_correlation_values")
 
     plt.figure()
-    plt.hist(corr_values)
+    corr_values.plot(merge=10)
     plt.title("Edge Weight Distribution")
     axes = plt.gca()
     axes.set_ylim([0,13000])
     plt.savefig(params['output_dest'] + "correlation_values.png")
     plt.figure()
-    plt.hist(par_corr_values)
+    par_corr_values.plot(merge=10)
     plt.title("Edge Weight Distribution")
     axes = plt.gca()
     axes.set_ylim([0,13000])
     plt.savefig(params['output_dest'] + "partial_correlation_values.png")
 
-    plt.figure()
-    plt.plot(shrinkages, label="Shrinkages")   
-    plt.savefig(params['output_dest'] + "shrinkages.png")
+    if estimator != 'graphical_lasso':
+        plt.figure()
+        plt.plot(shrinkages, label="Shrinkages")   
+        plt.savefig(params['output_dest'] + "shrinkages.png")
 
     plt.show()
     print("")
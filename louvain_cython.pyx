@@ -2,7 +2,10 @@ import numpy as np
 cimport numpy as np
 import networkx as nx
 DTYPE = np.double
-ctypedef np.double_t DTYPE_t
+# Every kernel is compiled for float32 and float64 adjacency matrices
+ctypedef fused DTYPE_t:
+    np.float32_t
+    np.float64_t
 ctypedef np.int_t DTYPE_int
 
 def modularity_classic(np.ndarray[DTYPE_t, ndim=2] M, np.ndarray[DTYPE_int, ndim=1] assignments):
@@ -370,7 +373,7 @@ def induced_graph(np.ndarray[DTYPE_t, ndim=2] M, np.ndarray[DTYPE_int, ndim=1] a
     p = M.shape[0]
     communities = list(set(assignments))
     no_communities = len(communities)
-    new_M = np.zeros((no_communities, no_communities))
+    new_M = np.zeros((no_communities, no_communities), dtype=M.dtype)
     # Folded contains the nodes that the community contains
     folded = {}
     if first:
@@ -401,7 +404,7 @@ def induced_graph(np.ndarray[DTYPE_t, ndim=2] M, np.ndarray[DTYPE_int, ndim=1] a
 
     return new_M, folded
     
-def run_louvain_nx(G, nodes=None, int max_iter=100, int signed=False, int correlation=False):
+def run_louvain_nx(G, nodes=None, int max_iter=100, int signed=False, int correlation=False, dtype=DTYPE):
     """
     Runs the Louvain community detection algorithm on a networkx graph
     Parameters
@@ -416,6 +419,8 @@ def run_louvain_nx(G, nodes=None, int max_iter=100, int signed=False, int correl
         If the graph is signed or not
     correlation : bool (optinal, default=False)
         If the graph is a correlation network
+    dtype : numpy dtype (optional, default=np.double)
+        Float type of the adjacency matrices, np.float32 or np.float64
 
     Returns
         tuple (dict, dict)
@@ -438,7 +443,7 @@ def run_louvain_nx(G, nodes=None, int max_iter=100, int signed=False, int correl
         node_labels = nodes
 
     while True:
-        M = nx.to_numpy_array(new_G)#, nodelist=nodes)
+        M = nx.to_numpy_array(new_G, dtype=dtype)#, nodelist=nodes)
 
         assignments = run_one_level(M, signed=signed, correlation=correlation)
         # Fold them into an induced graph
@@ -0,0 +1,82 @@
+import numpy as np
+import scipy.linalg
+
+
+def pairwise_standardized_statistics(Y):
+    """
+    Standardized sample covariance and Ledoit-Wolf shrinkage of a window of returns with
+    missing (NaN) values, every entry taken over the rows where both columns are present
+
+    Columns are standardized over their own present rows (as StandardScaler does with NaNs)
+    and the missing values set to 0, so the pairwise sums are plain matrix products of the
+    filled values and of the masks. Without missing values this is window_statistics
+
+    Parameters
+    ----------
+    Y : array_like
+        n by p window of returns, NaN where a company has no price
+    Returns
+    -------
+    tuple (S, shrinkage, counts)
+        S is the p by p pairwise standardized covariance (not necessarily positive
+        semidefinite), shrinkage the Ledoit-Wolf intensity and counts the number of rows
+        each entry of S was taken over
+    """
+    p = Y.shape[1]
+    present = ~np.isnan(Y)
+    mask = present.astype(Y.dtype)
+    counts = mask.T @ mask
+
+    n_present = present.sum(axis=0)
+    Z = np.where(present, Y, 0)
+    mean = np.divide(Z.sum(axis=0), n_present, out=np.zeros(p, dtype=Y.dtype), where=n_present > 0)
+    Z = np.where(present, Z - mean, 0)
+    var = np.divide((Z * Z).sum(axis=0), n_present, out=np.zeros(p, dtype=Y.dtype), where=n_present > 0)
+    # StandardScaler leaves constant columns unscaled, columns without any data are left at 0
+    var[var == 0] = 1
+    Z /= np.sqrt(var)
+
+    # Entries seen on fewer than 2 rows carry no information
+    valid = counts > 1
+    S = np.divide(Z.T @ Z, counts, out=np.zeros((p, p), dtype=Y.dtype), where=valid)
+    diagonal = np.diag(S).copy()
+    diagonal[~np.diag(valid)] = 1
+    np.fill_diagonal(S, diagonal)
+
+    # sklearn's Ledoit-Wolf shrinkage with every sum over n replaced by its pairwise count
+    Z2 = Z * Z
+    M4 = np.divide(Z2.T @ Z2, counts, out=np.zeros((p, p), dtype=Y.dtype), where=valid)
+    n = counts[valid].mean()
+    trace = np.trace(S)
+    mu = trace / p
+    beta_ = np.sum(M4)
+    delta_ = np.sum(S ** 2)
+    beta = 1.0 / (p * n) * (beta_ - delta_)
+    delta = (delta_ - 2.0 * mu * trace + p * mu ** 2) / p
+    beta = min(beta, delta)
+    shrinkage = 0 if beta == 0 else beta / delta
+    return S, shrinkage, counts
+
+
+def nearest_psd(S, min_eigenvalue=0):
+    """
+    Projects a symmetric matrix onto the positive semidefinite matrices by clipping its
+    eigenvalues, then rescales it so it keeps its diagonal
+
+    Parameters
+    ----------
+    S : array_like
+        p by p symmetric matrix, e.g. a pairwise covariance
+    min_eigenvalue : float (optional, default=0)
+        Eigenvalues below this are raised to it
+    Returns
+    -------
+    array_like
+        The projected matrix, S itself if it was already positive semidefinite
+    """
+    eigenvalues, eigenvectors = scipy.linalg.eigh(S)
+    if eigenvalues[0] >= min_eigenvalue:
+        return S
+    P = (eigenvectors * np.maximum(eigenvalues, min_eigenvalue)) @ eigenvectors.T
+    scale = np.sqrt(np.divide(np.diag(S), np.diag(P), out=np.ones(S.shape[0]), where=np.diag(P) > 0))
+    return P * np.outer(scale, scale)
@@ -11,6 +11,9 @@ import operator
 import matplotlib
 import louvain_cython as lcn
 from sklearn.metrics import adjusted_rand_score
+from window_store import load_networks, matrix_to_graph
+from returns_loader import load_returns
+from window_schedule import WindowSchedule
 
 def sort_dict(dct):
     """
@@ -87,10 +90,10 @@ def run(**params):
     np.seterr(all='raise')
 
     #df = pd.DataFrame.from_csv("s_and_p_500_sector_tagged.csv")
-    df = pd.read_csv(params['input_name'], index_col=0)
+    data = load_returns(params['input_name'], params.get('cache_dir'), dtype=params.get('dtype', np.float64), mmap=params.get('mmap', False))
     for networks_folder in [params['cor_dir'], params['pcor_dir']]:
-        company_sectors = df.iloc[0, :].values
-        company_names = df.T.index.values
+        company_sectors = data.company_sectors
+        company_names = data.company_names
         sectors = list(sorted(set(company_sectors)))
         num_sectors = len(sectors)
         company_sector_lookup = {}
@@ -98,35 +101,22 @@ def run(**params):
         for i,comp in enumerate(company_names):
             company_sector_lookup[comp] = company_sectors[i]
 
-        df_2 = df.iloc[1:, :]
-        df_2 = df_2.apply(pd.to_numeric)
-        df_2 = np.log(df_2) - np.log(df_2.shift(1))
-        X = df_2.values[1:, :]
+        X = data.X
 
         num_runs_community_detection = 10
 
-        window_size = 300
-        slide_size = 30
-        no_samples = X.shape[0]
         p = X.shape[1]
-        no_runs = math.floor((no_samples - window_size)/ (slide_size))
-        dates = []
+        schedule = WindowSchedule.from_returns(data, params.get('window_size', 300), params.get('slide_size', 30))
+        no_runs = schedule.no_runs
 
-        for x in range(no_runs):
-            dates.append(df.index[(x+1)*slide_size+window_size][0:10])
-
-        onlyfiles = [os.path.abspath(os.path.join(networks_folder, f)) for f in os.listdir(networks_folder) if os.path.isfile(os.path.join(networks_folder, f))]
-        #onlyfiles = list(map(lambda x: os.path.splitext(x)[0], onlyfiles))
-        Graphs = []
-
-        # Sort the files into order
-        ind = [int(Path(x).stem[23:]) for x in onlyfiles]
-        ind = np.argsort(np.array(ind))
-
-        for i in ind:
-            f = onlyfiles[i]
-            G = nx.read_graphml(f)
-            Graphs.append(G)
+        matrices, manifest = load_networks(networks_folder, sparse=params.get('sparse', False))
+        company_names = manifest['company_names']
+        company_sectors = manifest['company_sectors']
+        # Run the Louvain kernels in the precision the networks were stored in, only single
+        # precision needs the dtype argument of an extension rebuilt from the fused type .pyx
+        louvain_dtype = np.dtype(manifest.get('dtype', 'float64'))
+        louvain_kwargs = {} if louvain_dtype == np.float64 else {'dtype': louvain_dtype}
+        G = matrix_to_graph(matrices[0], company_names, company_sectors)
 
 
         max_eigs = np.zeros(no_runs)
@@ -166,13 +156,14 @@ def run(**params):
         np.save(networks_folder+"np/node_assignments", node_assignments)
         assignments_overall = np.zeros((no_runs, len(G.nodes), num_runs_community_detection))
 
-        for i,G in enumerate(Graphs):
+        for i in range(matrices.shape[0]):
             print("Running %s" % i)
+            G = matrix_to_graph(matrices[i], company_names, company_sectors)
             rand_scores = np.zeros(num_runs_community_detection)
             curr_assignments = []
             num_clusters = np.zeros(num_runs_community_detection)
             for run in range(num_runs_community_detection):
-	            communities, assignments_dct = lcn.run_louvain_nx(G, nodes, signed=True)
+	            communities, assignments_dct = lcn.run_louvain_nx(G, nodes, signed=True, **louvain_kwargs)
 	            assignments = np.zeros(len(G.nodes))
 	            nodes = list(G.nodes)
 	            for j,com in enumerate(communities):
@@ -200,13 +191,14 @@ def run(**params):
 	            cluster_consistency_all[i, :] = consistency
 
             prev_assigments = curr_assignments
+        matrices.close()
         np.save(networks_folder+"np/overall_assignments", assignments_overall)
 
         np.save(networks_folder+"np/_number_clusters.npy", number_clusters_all)
         np.save(networks_folder+"np/_cluster_consistency_all.npy", cluster_consistency_all)
         np.save(networks_folder+"np/_rand_scores_all.npy", rand_scores_all)
 
-        dt = pd.to_datetime(dates)
+        dt = schedule.dates()
         ts = pd.Series(rand_scores_mean, index=dt)
         fig = plt.figure()
         ax = ts.plot(yerr=rand_scores_stdev)
@@ -0,0 +1,138 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.stats import rankdata
+
+# Largest number of permuted values a batch of permutations holds at once
+BATCH_ELEMENTS = 2**22
+
+
+def window_rank_sums(x, y):
+    """
+    Ranks the pooled values of two (windows, p) arrays once and returns the sums every window
+    contributes to the Spearman correlation of the pooled values
+
+    Pairs where either value is NaN or infinite are left out. The ranks are centred on their
+    mean to keep the cancellation in the correlation small
+
+    Returns
+    -------
+    tuple (sums, rx, ry, window_of)
+        sums is a (windows, 6) array of n, sum rx, sum ry, sum rx^2, sum ry^2 and sum rx*ry of
+        every window, rx and ry the centred ranks of the kept pairs and window_of their windows
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    no_windows = x.shape[0]
+    keep = np.isfinite(x) & np.isfinite(y)
+    window_of = np.nonzero(keep)[0]
+    rx = rankdata(x[keep]) - (keep.sum() + 1) / 2
+    ry = rankdata(y[keep]) - (keep.sum() + 1) / 2
+    sums = np.stack([np.bincount(window_of, weights=w, minlength=no_windows)
+                     for w in [np.ones_like(rx), rx, ry, rx * rx, ry * ry, rx * ry]], axis=1)
+    return sums, rx, ry, window_of
+
+
+def spearman_from_sums(sums):
+    """
+    Returns the Spearman correlation of the pooled ranks of every row of a (..., 6) array of
+    sums as window_rank_sums gives, a weighted total of window sums for a resample
+    """
+    n, sx, sy, sxx, syy, sxy = np.moveaxis(sums, -1, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (sxy - sx * sy / n) / np.sqrt((sxx - sx * sx / n) * (syy - sy * sy / n))
+
+
+def block_bootstrap_counts(rng, resamples, no_windows, block_size):
+    """
+    Draws moving block bootstrap resamples of the windows, every resample joins randomly placed
+    runs of block_size consecutive windows until it has no_windows of them
+
+    Returns
+    -------
+    array_like
+        (resamples, no_windows) number of times every window is in every resample
+    """
+    no_blocks = -(-no_windows // block_size)
+    starts = rng.randint(0, no_windows - block_size + 1, size=(resamples, no_blocks))
+    windows = (starts[:, :, None] + np.arange(block_size)).reshape(resamples, -1)[:, :no_windows]
+    windows = windows + no_windows * np.arange(resamples)[:, None]
+    return np.bincount(windows.ravel(), minlength=resamples * no_windows).reshape(resamples, no_windows)
+
+
+def _bootstrap_batch(task):
+    sums, block_size, seed, size = task
+    counts = block_bootstrap_counts(np.random.RandomState(seed), size, len(sums), block_size)
+    return spearman_from_sums(counts @ sums)
+
+
+def _permutation_batch(task):
+    rx, ry, window_of, seed, size = task
+    rng = np.random.RandomState(seed)
+    # Sorting on the window plus a random fraction shuffles the pairs within every window
+    keys = window_of + rng.random_sample((size, len(ry)))
+    return ry[np.argsort(keys, axis=1)] @ rx
+
+
+def _run_batches(function, tasks, workers):
+    if workers == 1:
+        return np.concatenate(list(map(function, tasks)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(function, tasks)))
+
+
+def _batches(resamples, batch_size, rng):
+    # Every batch gets its own seed drawn up front, the results don't depend on the workers
+    sizes = [min(batch_size, resamples - start) for start in range(0, resamples, batch_size)]
+    return zip(rng.randint(0, 2**32, size=len(sizes), dtype=np.int64), sizes)
+
+
+def spearman_inference(x, y, resamples=10000, block_size=None, alpha=0.05, seed=None, workers=1):
+    """
+    Spearman correlation of the pooled values of two (windows, p) arrays, e.g. centralities
+    and Sharpe ratios, with a block bootstrap confidence interval and a permutation p-value
+
+    The values are ranked once. A bootstrap resample weighs the per window rank sums by how
+    often it draws every window, so a batch of resamples is one matrix product, resampling
+    whole windows in blocks keeps the dependence between neighbouring overlapping windows.
+    A permutation shuffles y within every window, the companies a window is compared over
+    stay the same. Resamples use the ranks of the full sample rather than reranking
+
+    Parameters
+    ----------
+    x, y : array_like
+        (windows, p) arrays, pairs with a NaN or infinite value are left out
+    resamples : int (optional, default=10000)
+        Number of bootstrap resamples and of permutations
+    block_size : int (optional, default=None)
+        Number of consecutive windows in a bootstrap block, the cube root of the number of windows if None
+    alpha : float (optional, default=0.05)
+        The confidence interval covers 1 - alpha
+    seed : int (optional, default=None)
+        Seed of the random resamples
+    workers : int (optional, default=1)
+        Number of processes the batches of resamples are spread over, 1 to run in this process
+    Returns
+    -------
+    dict
+        rho, the confidence interval ci_low and ci_high, the two sided permutation p_value,
+        the number of pairs n and the resamples and block_size used
+    """
+    sums, rx, ry, window_of = window_rank_sums(x, y)
+    no_windows = len(sums)
+    if block_size is None:
+        block_size = max(1, int(round(no_windows ** (1 / 3))))
+    block_size = min(block_size, no_windows)
+    rho = float(spearman_from_sums(sums.sum(axis=0)))
+
+    rng = np.random.RandomState(seed)
+    tasks = [(sums, block_size, s, size) for s, size in _batches(resamples, max(1, BATCH_ELEMENTS // no_windows), rng)]
+    bootstrap = _run_batches(_bootstrap_batch, tasks, workers)
+    ci_low, ci_high = np.nanquantile(bootstrap, [alpha / 2, 1 - alpha / 2])
+
+    tasks = [(rx, ry, window_of, s, size) for s, size in _batches(resamples, max(1, BATCH_ELEMENTS // max(1, len(rx))), rng)]
+    permuted = spearman_from_sums(np.column_stack([np.broadcast_to(sums.sum(axis=0)[:5], (resamples, 5)),
+                                                   _run_batches(_permutation_batch, tasks, workers)]))
+    p_value = (1 + np.sum(np.abs(permuted) >= abs(rho))) / (resamples + 1)
+
+    return {'rho': rho, 'ci_low': float(ci_low), 'ci_high': float(ci_high), 'p_value': float(p_value),
+            'n': len(rx), 'resamples': resamples, 'block_size': block_size}
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+ReturnsData = namedtuple('ReturnsData', ['X', 'company_names', 'company_sectors', 'index'])
+ReturnsData.__doc__ = """
+Log returns of the price file
+
+X is the (samples, p) matrix of log returns, NaN where a price is missing, company_names and company_sectors are
+length p arrays and index holds the row labels of the price file, so index[r+2] is the
+date of row r of X (the sector row and the first return are dropped)
+"""
+
+RETURNS_FILE = "returns.npy"
+METADATA_FILE = "returns.json"
+_loaded = {}
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Returns the sha1 of the contents of a file
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_prices(input_name, dtype=np.float64):
+    """
+    Reads the price file straight into a float array, the header and sector row are read
+    on their own so the price columns are parsed as numbers rather than as objects
+
+    Returns
+    -------
+    tuple (prices, company_names, company_sectors, index)
+        prices is the (dates, p) array, index the row labels of the file including the sector row
+    """
+    header = pd.read_csv(input_name, index_col=0, nrows=1, dtype=str)
+    company_names = header.columns.values.astype(str)
+    company_sectors = header.iloc[0, :].values.astype(str)
+    df = pd.read_csv(input_name, index_col=0, skiprows=[1], dtype={name: dtype for name in company_names})
+    index = np.concatenate([header.index.values.astype(str), df.index.values.astype(str)])
+    return df.values, company_names, company_sectors, index
+
+
+def valid_prices(prices):
+    """
+    Marks zero and negative prices (e.g. before a listing or after a delisting) as missing,
+    so their log returns are NaN instead of raising under np.seterr(all='raise')
+    """
+    return np.where(prices > 0, prices, np.nan)
+
+
+def parse_returns(input_name, dtype=np.float64):
+    """
+    Reads the price file and turns the prices into log returns
+    """
+    prices, company_names, company_sectors, index = read_prices(input_name, dtype)
+    X = np.diff(np.log(valid_prices(prices)), axis=0)
+    return ReturnsData(X, company_names, company_sectors, index)
+
+
+def write_metadata(folder, company_names, company_sectors, index, dtype):
+    """
+    Writes the json sidecar of saved returns holding their labels
+    """
+    metadata = {
+        'company_names': company_names.tolist(),
+        'company_sectors': company_sectors.tolist(),
+        'index': index.tolist(),
+        'dtype': np.dtype(dtype).name,
+    }
+    with open(os.path.join(folder, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f)
+
+
+def save_returns(folder, data):
+    """
+    Saves parsed returns as an .npy file with a json sidecar holding the labels
+    """
+    os.makedirs(folder, exist_ok=True)
+    np.save(os.path.join(folder, RETURNS_FILE), data.X)
+    write_metadata(folder, data.company_names, data.company_sectors, data.index, data.X.dtype)
+
+
+def write_returns_out_of_core(input_name, folder, dtype=np.float64, chunksize=10000):
+    """
+    Turns the price file into log returns saved like save_returns without ever holding
+    more than chunksize rows of prices, the returns are written into a memory mapped .npy
+    """
+    header = pd.read_csv(input_name, index_col=0, nrows=1, dtype=str)
+    company_names = header.columns.values.astype(str)
+    company_sectors = header.iloc[0, :].values.astype(str)
+    with open(input_name, 'rb') as f:
+        # Less the column header and the sector row
+        no_prices = sum(1 for line in f if line.strip()) - 2
+
+    os.makedirs(folder, exist_ok=True)
+    X = np.lib.format.open_memmap(os.path.join(folder, RETURNS_FILE), mode='w+', dtype=dtype,
+                                  shape=(no_prices - 1, len(company_names)))
+    dates = [header.index.values.astype(str)]
+    last = None
+    row = 0
+    for df in pd.read_csv(input_name, index_col=0, skiprows=[1], dtype={name: dtype for name in company_names}, chunksize=chunksize):
+        dates.append(df.index.values.astype(str))
+        log_prices = np.log(valid_prices(df.values))
+        if last is not None:
+            log_prices = np.concatenate([last, log_prices])
+        returns = np.diff(log_prices, axis=0)
+        X[row:row + len(returns)] = returns
+        row += len(returns)
+        last = log_prices[-1:]
+    X.flush()
+    del X
+    write_metadata(folder, company_names, company_sectors, np.concatenate(dates), dtype)
+
+
+def read_saved_returns(folder, mmap_mode=None):
+    """
+    Loads returns saved with save_returns, memory mapping them if mmap_mode is given
+    """
+    with open(os.path.join(folder, METADATA_FILE)) as f:
+        metadata = json.load(f)
+    X = np.load(os.path.join(folder, RETURNS_FILE), mmap_mode=mmap_mode)
+    return ReturnsData(X, np.array(metadata['company_names']), np.array(metadata['company_sectors']), np.array(metadata['index']))
+
+
+def load_returns(input_name, cache_dir=None, dtype=np.float64, mmap=False):
+    """
+    Loads the log returns of a price file, parsing it only once
+
+    Parsed files are kept for the rest of the process and, if cache_dir is given,
+    saved there as an .npy file and json sidecar keyed by the hash of the file so
+    later runs skip parsing
+
+    Parameters
+    ----------
+    input_name : str
+        Price file with the sector row as its first row
+    cache_dir : str (optional, default=None)
+        Folder to keep the parsed returns in
+    dtype : dtype (optional, default=np.float64)
+        Float type the prices are parsed into
+    mmap : bool (optional, default=False)
+        Memory map the returns from the cache instead of loading them, for universes that
+        don't fit in memory, the cache is then also built a chunk of rows at a time
+    Returns
+    -------
+    data : ReturnsData
+    """
+    if mmap and cache_dir is None:
+        raise ValueError("Memory mapped returns need a cache_dir to keep them in")
+    dtype = np.dtype(dtype)
+    stat = os.stat(input_name)
+    key = (os.path.abspath(input_name), stat.st_mtime_ns, stat.st_size, dtype.name, mmap)
+    if key in _loaded:
+        return _loaded[key]
+
+    folder = None
+    if cache_dir is not None:
+        folder = os.path.join(cache_dir, file_hash(input_name), dtype.name)
+
+    # The sidecar is written last so it only exists for complete caches
+    if folder is not None and os.path.isfile(os.path.join(folder, METADATA_FILE)):
+        data = read_saved_returns(folder, 'r' if mmap else None)
+    elif mmap:
+        write_returns_out_of_core(input_name, folder, dtype)
+        data = read_saved_returns(folder, 'r')
+    else:
+        data = parse_returns(input_name, dtype)
+        if folder is not None:
+            save_returns(folder, data)
+
+    # Shared between the pipeline stages so nobody may modify it in place
+    for values in data:
+        values.setflags(write=False)
+    _loaded[key] = data
+    return data
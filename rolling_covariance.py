@@ -0,0 +1,215 @@
+import numpy as np
+
+# Above this many columns the moment sums are computed a block of columns at a time
+BLOCK_SIZE = 1024
+
+
+def moment_sums(Y, shift=None, block_size=BLOCK_SIZE):
+    """
+    Returns the raw moment sums of the rows of Y needed to rebuild the standardized
+    covariance and the Ledoit-Wolf shrinkage of any window made up of those rows
+
+    Parameters
+    ----------
+    Y : array_like
+        n by p block of returns, may be a memory mapped slice
+    shift : array_like (optional, default=None)
+        Subtracted from every row of Y before taking the sums
+    block_size : int (optional, default=BLOCK_SIZE)
+        If p is larger, work through blocks of this many columns so only n by block_size
+        temporaries are made instead of copies of the whole block
+    Returns
+    -------
+    sums : tuple (n, s1, s2, s3, s4)
+        n is the number of rows, s1 the column sums, s2 = sum y y^T,
+        s3 = sum (y*y) y^T and s4 = sum (y*y) (y*y)^T
+    """
+    p = Y.shape[1]
+    if block_size is not None and p > block_size:
+        return _blocked_moment_sums(Y, shift, block_size)
+    if shift is not None:
+        Y = Y - shift
+    Y2 = Y * Y
+    return (Y.shape[0], Y.sum(axis=0), Y.T @ Y, Y2.T @ Y, Y2.T @ Y2)
+
+
+def _blocked_moment_sums(Y, shift, block_size):
+    n, p = Y.shape
+    if shift is None:
+        shift = np.zeros(p, dtype=Y.dtype)
+    s1 = np.zeros(p, dtype=Y.dtype)
+    s2, s3, s4 = (np.zeros((p, p), dtype=Y.dtype) for _ in range(3))
+    blocks = [slice(i, min(i + block_size, p)) for i in range(0, p, block_size)]
+    for k, bi in enumerate(blocks):
+        Yi = Y[:, bi] - shift[bi]
+        Y2i = Yi * Yi
+        s1[bi] = Yi.sum(axis=0)
+        for bj in blocks[k:]:
+            Yj = Yi if bj == bi else Y[:, bj] - shift[bj]
+            Y2j = Yj * Yj
+            s2[bi, bj] = Yi.T @ Yj
+            s2[bj, bi] = s2[bi, bj].T
+            s3[bi, bj] = Y2i.T @ Yj
+            s3[bj, bi] = Y2j.T @ Yi
+            s4[bi, bj] = Y2i.T @ Y2j
+            s4[bj, bi] = s4[bi, bj].T
+    return (n, s1, s2, s3, s4)
+
+
+def standardized_statistics(n, s1, s2, s3, s4):
+    """
+    Turns the moment sums of a window into the sample covariance of the standardized
+    window (what StandardScaler followed by LedoitWolf sees) and its Ledoit-Wolf shrinkage
+
+    Returns
+    -------
+    tuple (S, shrinkage)
+        S is the p by p standardized sample covariance, shrinkage the Ledoit-Wolf intensity
+    """
+    p = s1.shape[0]
+    m = s1 / n
+    C = s2 / n - np.outer(m, m)
+    var = np.diag(C).copy()
+    # StandardScaler leaves constant columns unscaled
+    var[var == 0] = 1
+    S = C / np.sqrt(np.outer(var, var))
+
+    # Fourth central moments sum_k (y_ki - m_i)^2 (y_kj - m_j)^2 expanded in raw sums
+    q = np.diag(s2)
+    mm = np.outer(m, m)
+    M4 = (s4 - 2 * s3 * m[None, :] - 2 * s3.T * m[:, None]
+          + np.outer(q, m * m) + np.outer(m * m, q)
+          + 4 * mm * s2 - 3 * n * mm * mm)
+
+    # Same quantities as sklearn.covariance.ledoit_wolf_shrinkage on the standardized data
+    trace = np.trace(S)
+    mu = trace / p
+    beta_ = np.sum(M4 / np.outer(var, var))
+    delta_ = np.sum(S ** 2)
+    beta = 1.0 / (p * n) * (beta_ / n - delta_)
+    delta = (delta_ - 2.0 * mu * trace + p * mu ** 2) / p
+    beta = min(beta, delta)
+    shrinkage = 0 if beta == 0 else beta / delta
+    return S, shrinkage
+
+
+def window_statistics(X_new):
+    """
+    Returns the standardized sample covariance of a window of returns and its Ledoit-Wolf shrinkage
+    """
+    return standardized_statistics(*moment_sums(X_new, X_new.mean(axis=0)))
+
+
+class RollingCovariance:
+    """
+    Keeps running moment sums over a window of rows of X so that sliding the window
+    only touches the rows entering and leaving it instead of re-scanning the whole window
+    """
+
+    def __init__(self, X, rebase_every=100):
+        """
+        Parameters
+        ----------
+        X : array_like
+            n by p matrix of returns the windows are taken from
+        rebase_every : int (optional, default=100)
+            Recompute the sums from scratch after this many slides to stop
+            rounding errors from building up, 0 to never rebase
+        """
+        self.X = X
+        self.rebase_every = rebase_every
+        self.start = 0
+        self.stop = 0
+        self.slides = 0
+        self.shift = None
+        self.sums = None
+
+    def _sums(self, start, stop):
+        return moment_sums(self.X[start:stop, :], self.shift)
+
+    def _reset(self, start, stop):
+        # Centre the sums on the first window to keep the cancellation in C small
+        self.shift = self.X[start:stop, :].mean(axis=0)
+        # Accumulate in double precision whatever the type of X, or float32 returns drift from slide to slide
+        self.sums = tuple(np.asarray(s, dtype=np.float64) for s in self._sums(start, stop))
+        self.start, self.stop = start, stop
+        self.slides = 0
+
+    def _update(self, start, stop, sign):
+        if stop <= start:
+            return
+        delta = self._sums(start, stop)
+        self.sums = tuple(a + sign * b for a, b in zip(self.sums, delta))
+
+    def move_to(self, start, stop):
+        """
+        Moves the window to rows [start, stop) adding the entering and evicting the leaving rows
+        """
+        rebase = self.rebase_every and self.slides >= self.rebase_every
+        if self.sums is None or rebase or start >= self.stop or stop <= self.start:
+            self._reset(start, stop)
+            return
+
+        self._update(start, min(self.start, stop), 1)
+        self._update(max(self.stop, start), stop, 1)
+        self._update(self.start, min(start, self.stop), -1)
+        self._update(max(stop, self.start), self.stop, -1)
+        self.start, self.stop = start, stop
+        self.slides += 1
+
+    def statistics(self):
+        """
+        Returns the standardized sample covariance of the current window and its Ledoit-Wolf shrinkage
+        """
+        return standardized_statistics(*self.sums)
+
+
+def prefix_window_sums(X, bounds):
+    """
+    Returns the moment sums of many windows of rows of X, of any lengths and overlaps,
+    in a single pass over X
+
+    The sums of all rows before every window boundary are accumulated block by block,
+    a window's sums are then the difference of these prefix sums at its stop and start.
+    Only the prefix sums at the starts of windows not yet finished are kept in memory
+
+    Parameters
+    ----------
+    X : array_like
+        n by p matrix of returns
+    bounds : list
+        (start, stop) rows of each window
+    Returns
+    -------
+    generator of tuples (i, sums)
+        i is the position of the window in bounds and sums its moment sums (as moment_sums,
+        of the rows shifted by the mean of X), in order of the window stops
+    """
+    bounds = np.asarray(bounds)
+    # Centre on the mean of all rows to keep the cancellation in the differences small
+    shift = X.mean(axis=0)
+    open_windows = {}
+    for i, (start, stop) in enumerate(bounds):
+        open_windows.setdefault(int(start), []).append(i)
+    closing = {}
+    for i, (start, stop) in enumerate(bounds):
+        closing.setdefault(int(stop), []).append(i)
+
+    p = X.shape[1]
+    prefix = (0, np.zeros(p), np.zeros((p, p)), np.zeros((p, p)), np.zeros((p, p)))
+    saved = {}
+    remaining = {start: len(windows) for start, windows in open_windows.items()}
+    previous = 0
+    for boundary in sorted(set(open_windows) | set(closing)):
+        if boundary > previous:
+            block = moment_sums(X[previous:boundary, :], shift)
+            prefix = tuple(a + b for a, b in zip(prefix, block))
+            previous = boundary
+        if boundary in open_windows:
+            saved[boundary] = prefix
+        for i in sorted(closing.get(boundary, [])):
+            start = int(bounds[i, 0])
+            yield i, tuple(a - b for a, b in zip(prefix, saved[start]))
+            remaining[start] -= 1
+            if remaining[start] == 0:
+                del saved[start]
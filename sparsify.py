@@ -0,0 +1,115 @@
+import numpy as np
+import scipy.sparse
+from scipy.stats import norm
+
+
+def _to_csr(M, keep):
+    """
+    Keeps the entries of M where keep is True (made symmetric) plus the diagonal, as CSR
+    """
+    keep = keep | keep.T
+    np.fill_diagonal(keep, True)
+    rows, cols = np.nonzero(keep)
+    return scipy.sparse.csr_matrix((M[rows, cols], (rows, cols)), shape=M.shape)
+
+
+def _offdiagonal_abs(M):
+    A = np.abs(M)
+    np.fill_diagonal(A, -np.inf)
+    return A
+
+
+def top_k_per_node(M, k):
+    """
+    Keeps the k strongest (absolute) edges of every node, an edge is kept if it is
+    in the top k of either of its nodes
+    """
+    A = _offdiagonal_abs(M)
+    p = M.shape[0]
+    k = min(k, p - 1)
+    cols = np.argpartition(-A, k - 1, axis=1)[:, :k]
+    keep = np.zeros(M.shape, dtype=bool)
+    keep[np.repeat(np.arange(p), k), cols.ravel()] = True
+    return _to_csr(M, keep)
+
+
+def edge_budget(M, no_edges):
+    """
+    Keeps the no_edges strongest (absolute) edges of the whole network
+    """
+    rows, cols = np.triu_indices(M.shape[0], k=1)
+    values = np.abs(M[rows, cols])
+    no_edges = min(no_edges, len(values))
+    keep = np.zeros(M.shape, dtype=bool)
+    if no_edges > 0:
+        ind = np.argpartition(-values, no_edges - 1)[:no_edges]
+        keep[rows[ind], cols[ind]] = True
+    return _to_csr(M, keep)
+
+
+def quantile_threshold(M, q):
+    """
+    Keeps the edges whose absolute weight is at least the q quantile of all absolute edge weights
+    """
+    rows, cols = np.triu_indices(M.shape[0], k=1)
+    threshold = np.quantile(np.abs(M[rows, cols]), q)
+    return _to_csr(M, _offdiagonal_abs(M) >= threshold)
+
+
+def significance_dof(n_samples, n_conditioning=0):
+    """
+    Degrees of freedom of the Fisher z test of a (partial) correlation, raises a ValueError
+    if there are too few samples for the number of variables partialled out
+    """
+    dof = n_samples - 3 - n_conditioning
+    if dof <= 0:
+        raise ValueError("Not enough samples (%s) for a significance test conditioning on %s variables" % (n_samples, n_conditioning))
+    return dof
+
+
+def significance_threshold(M, level, n_samples, n_conditioning=0):
+    """
+    Keeps the edges whose (partial) correlation is significantly different from zero at
+    the given level by a two sided Fisher z test of n_samples returns, n_conditioning is the
+    number of variables partialled out (0 for correlations, p - 2 for full partial correlations)
+    """
+    dof = significance_dof(n_samples, n_conditioning)
+    threshold = np.tanh(norm.ppf(1 - level / 2) / np.sqrt(dof))
+    return _to_csr(M, _offdiagonal_abs(M) > threshold)
+
+
+METHODS = {
+    'top_k': top_k_per_node,
+    'edge_budget': edge_budget,
+    'quantile': quantile_threshold,
+    'significance': significance_threshold,
+}
+
+
+def check_sparsify(method, value, n_samples=None, n_conditioning=0):
+    """
+    Raises a ValueError if a network can't be sparsified with method and value, so a run can
+    stop before estimating any network. n_samples is the shortest window and n_conditioning
+    the most variables partialled out, only the significance test needs them
+    """
+    if method not in METHODS:
+        raise ValueError("%s is not a valid sparsification method" % method)
+    if value is None:
+        raise ValueError("Sparsifying with %s needs a value" % method)
+    if method in ('top_k', 'edge_budget') and (int(value) != value or value < 0):
+        raise ValueError("%s needs a whole number of edges, not %s" % (method, value))
+    if method == 'quantile' and not 0 <= value <= 1:
+        raise ValueError("The quantile must be between 0 and 1, not %s" % value)
+    if method == 'significance':
+        if not 0 < value < 1:
+            raise ValueError("The significance level must be between 0 and 1, not %s" % value)
+        significance_dof(n_samples, n_conditioning)
+
+
+def sparsify(M, method, value, **kwargs):
+    """
+    Sparsifies a network matrix with one of the methods above, by name
+    """
+    if method not in METHODS:
+        raise ValueError("%s is not a valid sparsification method" % method)
+    return METHODS[method](np.asarray(M), value, **kwargs)
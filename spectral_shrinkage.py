@@ -0,0 +1,52 @@
+import numpy as np
+import scipy.linalg
+
+
+class SpectralShrinkage:
+    """
+    Ledoit-Wolf style shrinkage towards mu*I through a single eigendecomposition of the
+    sample covariance S: the shrunk covariance (1-a)*S + a*mu*I and its inverse share
+    the eigenvectors of S, so any intensity a only rescales the eigenvalues
+    """
+
+    def __init__(self, S):
+        """
+        Parameters
+        ----------
+        S : array_like
+            p by p sample covariance of a window
+        """
+        p = S.shape[0]
+        self.eigenvalues, self.eigenvectors = scipy.linalg.eigh(S)
+        self.mu = np.trace(S) / p
+
+    def shrunk_eigenvalues(self, shrinkage):
+        """
+        Returns the eigenvalues of the shrunk covariance, one row per intensity if shrinkage is an array
+        """
+        shrinkage = np.asarray(shrinkage, dtype=float)[..., None]
+        return (1 - shrinkage) * self.eigenvalues + shrinkage * self.mu
+
+    def _compose(self, values):
+        # V diag(values) V^T, batched over the leading axes of values
+        V = self.eigenvectors
+        return (V * values[..., None, :]) @ V.T
+
+    def covariance(self, shrinkage):
+        """
+        Returns the shrunk covariance, stacked (len(shrinkage), p, p) if shrinkage is an array
+        """
+        return self._compose(self.shrunk_eigenvalues(shrinkage))
+
+    def precision(self, shrinkage):
+        """
+        Returns the inverse of the shrunk covariance, stacked if shrinkage is an array
+
+        Eigenvalues below the cutoff scipy.linalg.pinvh uses are dropped so a shrinkage
+        of 0 gives the pseudo-inverse of a singular S
+        """
+        values = self.shrunk_eigenvalues(shrinkage)
+        cutoff = values.shape[-1] * np.finfo(values.dtype).eps * np.abs(values).max(axis=-1, keepdims=True)
+        inverse = np.zeros_like(values)
+        np.divide(1, values, out=inverse, where=np.abs(values) > cutoff)
+        return self._compose(inverse)
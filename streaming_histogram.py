@@ -0,0 +1,128 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+class StreamingHistogram:
+    """
+    Histogram of a stream of values that only keeps bin counts, both pooled over
+    everything seen so far and for each batch (e.g. each window) separately
+    """
+
+    def __init__(self, bins=100, range=(-1, 1), adaptive=False):
+        """
+        Parameters
+        ----------
+        bins : int (optional, default=100)
+            Number of equal width bins, must be even if adaptive
+        range : tuple (optional, default=(-1, 1))
+            Lower and upper edge of the bins
+        adaptive : bool (optional, default=False)
+            Double the width of the bins whenever values fall outside of the range,
+            if not they are counted as under or overflow
+        """
+        if adaptive and bins % 2:
+            raise ValueError("An adaptive histogram needs an even number of bins")
+        self.edges = np.linspace(range[0], range[1], bins + 1)
+        self.adaptive = adaptive
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.batch_counts = []
+        self.underflow = 0
+        self.overflow = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _widen(self, lo, hi):
+        """
+        Merges pairs of bins, doubling the range, until [lo, hi] fits
+        """
+        while lo < self.edges[0] or hi > self.edges[-1]:
+            bins = len(self.counts)
+            width = self.edges[-1] - self.edges[0]
+            # Grow on the side that overflows, keeping the old edges as edges
+            if lo < self.edges[0]:
+                start = self.edges[0] - width
+                offset = bins // 2
+            else:
+                start = self.edges[0]
+                offset = 0
+            self.edges = np.linspace(start, start + 2 * width, bins + 1)
+            self.counts = self._merge(self.counts, offset)
+            self.batch_counts = [self._merge(c, offset) for c in self.batch_counts]
+
+    @staticmethod
+    def _merge(counts, offset):
+        merged = counts.reshape(-1, 2).sum(axis=1)
+        new = np.zeros_like(counts)
+        new[offset:offset + len(merged)] = merged
+        return new
+
+    def update(self, values):
+        """
+        Adds a batch of values to the histogram
+        """
+        values = np.asarray(values).ravel()
+        if values.size == 0:
+            return
+        lo, hi = values.min(), values.max()
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+        if self.adaptive:
+            self._widen(lo, hi)
+        else:
+            self.underflow += int(np.count_nonzero(values < self.edges[0]))
+            self.overflow += int(np.count_nonzero(values > self.edges[-1]))
+        counts, _ = np.histogram(values, self.edges)
+        self.counts += counts
+        self.batch_counts.append(counts)
+
+    def total(self):
+        """
+        Returns the number of values seen
+        """
+        return int(self.counts.sum()) + self.underflow + self.overflow
+
+    def quantile(self, q):
+        """
+        Approximates the q quantile(s) by interpolating linearly within the bins, the error
+        is at most one bin width (over/underflow are pinned to the observed min and max)
+        """
+        q = np.asarray(q, dtype=float)
+        cum = np.concatenate([[0, self.underflow], self.underflow + np.cumsum(self.counts)])
+        cum = np.append(cum, cum[-1] + self.overflow)
+        edges = np.concatenate([[min(self.min, self.edges[0])], self.edges, [max(self.max, self.edges[-1])]])
+        return np.interp(q * self.total(), cum, edges)
+
+    def save(self, path):
+        """
+        Saves the bin counts to an .npz file
+        """
+        np.savez(path, edges=self.edges, counts=self.counts, batch_counts=np.array(self.batch_counts).reshape(-1, len(self.counts)),
+                 underflow=self.underflow, overflow=self.overflow, min=self.min, max=self.max, adaptive=self.adaptive)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads bin counts saved with save
+        """
+        f = np.load(path)
+        hist = cls(len(f['counts']), (f['edges'][0], f['edges'][-1]), bool(f['adaptive']))
+        hist.edges = f['edges']
+        hist.counts = f['counts']
+        hist.batch_counts = list(f['batch_counts'])
+        hist.underflow = int(f['underflow'])
+        hist.overflow = int(f['overflow'])
+        hist.min = float(f['min'])
+        hist.max = float(f['max'])
+        return hist
+
+    def plot(self, merge=1, per_batch=True):
+        """
+        Plots the histogram like plt.hist would have with the raw values, one set of bars
+        per batch if per_batch, merging every merge bins into one
+        """
+        edges = self.edges[::merge]
+        if per_batch and self.batch_counts:
+            weights = [c.reshape(-1, merge).sum(axis=1) for c in self.batch_counts]
+        else:
+            weights = [self.counts.reshape(-1, merge).sum(axis=1)]
+        return plt.hist([edges[:-1]] * len(weights), bins=edges, weights=weights)
@@ -0,0 +1,114 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Rows of the returns are 2 behind the index of the price file as the sector row
+# and the first return are dropped
+INDEX_OFFSET = 2
+
+
+class WindowSchedule:
+    """
+    Row bounds, dates and overlaps of the sliding windows every stage works on, computed
+    once as integer arrays so no stage has to redo the window arithmetic
+
+    Window 0 covers rows [0, window_size) of the returns and window x > 0 rows
+    [x*slide_size, (x+1)*slide_size + window_size), as the networks were always inferred
+    """
+
+    def __init__(self, no_samples, window_size=300, slide_size=30, index=None):
+        """
+        Parameters
+        ----------
+        no_samples : int
+            Number of rows of returns
+        window_size : int (optional, default=300)
+            Number of rows of the first window
+        slide_size : int (optional, default=30)
+            Number of rows every window moves on from the last one
+        index : array_like (optional, default=None)
+            Row labels of the price file (ReturnsData.index) to take the window dates from
+        """
+        self.no_samples = no_samples
+        self.window_size = window_size
+        self.slide_size = slide_size
+        self.no_runs = math.floor((no_samples - window_size) / slide_size)
+
+        x = np.arange(self.no_runs)
+        self.starts = x * slide_size
+        self.stops = (x + 1) * slide_size + window_size
+        self.stops[:1] = window_size
+        self.lengths = self.stops - self.starts
+        # Rows shared by every window and the next one
+        self.overlaps = np.maximum(self.stops[:-1] - self.starts[1:], 0)
+
+        self.index = index
+        self.start_dates = self.end_dates = None
+        if index is not None:
+            index = np.asarray(index)
+            self.start_dates = np.array([d[0:10] for d in index[self.starts + INDEX_OFFSET]])
+            self.end_dates = np.array([d[0:10] for d in index[self.stops - 1 + INDEX_OFFSET]])
+
+    @classmethod
+    def from_returns(cls, data, window_size=300, slide_size=30):
+        """
+        Returns the schedule of the windows over a ReturnsData
+        """
+        return cls(data.X.shape[0], window_size, slide_size, data.index)
+
+    def __len__(self):
+        return self.no_runs
+
+    @property
+    def bounds(self):
+        """
+        (no_runs, 2) array of the [start, stop) rows of every window
+        """
+        return np.stack([self.starts, self.stops], axis=1)
+
+    def window(self, X, i):
+        """
+        Returns the rows of X in window i, a view and not a copy
+        """
+        return X[self.starts[i]:self.stops[i]]
+
+    def windows(self, X):
+        """
+        Iterates over the windows of X as views
+        """
+        for start, stop in zip(self.starts, self.stops):
+            yield X[start:stop]
+
+    def forward_window(self, X, i):
+        """
+        Returns the rows of X in the window after window i, or window i itself for the
+        last window, the period whose returns the network of window i is compared to
+        """
+        return self.window(X, min(i + 1, self.no_runs - 1))
+
+    def forward_bounds(self):
+        """
+        (no_runs, 2) array of the [start, stop) rows of the forward window of every window
+        """
+        return self.bounds[np.minimum(np.arange(self.no_runs) + 1, self.no_runs - 1)]
+
+    def stacked(self, X):
+        """
+        Returns windows 1 to no_runs-1, which all have the same length, as a
+        (no_runs-1, length, p) strided view of X without copying
+        """
+        length = self.slide_size + self.window_size
+        X = np.asarray(X)
+        row, column = X.strides
+        return np.lib.stride_tricks.as_strided(X[self.slide_size:], shape=(self.no_runs - 1, length, X.shape[1]),
+                                               strides=(self.slide_size * row, row, column), writeable=False)
+
+    def dates(self):
+        """
+        Returns the dates the stages plot the windows against as a pandas DatetimeIndex,
+        index[(x+1)*slide_size + window_size] for window x, exactly one slide apart
+        (the end of the window within a day, the first window aside)
+        """
+        rows = (np.arange(self.no_runs) + 1) * self.slide_size + self.window_size
+        return pd.to_datetime(np.asarray(self.index)[rows].astype('U10'))
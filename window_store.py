@@ -0,0 +1,524 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import networkx as nx
+import numpy as np
+import scipy.sparse
+
+from graphml_reader import read_graphml_matrix, iter_graphml_matrices
+
+STORE_FOLDER = "store/"
+MATRICES_FILE = "windows.npy"
+MANIFEST_FILE = "manifest.json"
+SPARSE_FILES = ["sparse_data", "sparse_indices", "sparse_indptr", "sparse_offsets"]
+
+
+@lru_cache(maxsize=8)
+def upper_indices(p):
+    """
+    Returns the (rows, cols) of the strict upper triangle of a p by p matrix, in packing order
+    """
+    return np.triu_indices(p, k=1)
+
+
+def packed_size(p):
+    """
+    Returns the number of values in the packed form of a p by p symmetric matrix
+    """
+    return p * (p - 1) // 2
+
+
+def packed_p(m):
+    """
+    Returns p for a packed vector holding m values
+    """
+    p = int(round((1 + np.sqrt(1 + 8 * m)) / 2))
+    if packed_size(p) != m:
+        raise ValueError("%s is not the length of a packed symmetric matrix" % m)
+    return p
+
+
+def pack_upper(M):
+    """
+    Packs a symmetric matrix, or a stack of them with shape (windows, p, p), into
+    the p(p-1)/2 values of its strict upper triangle
+    """
+    M = np.asarray(M)
+    rows, cols = upper_indices(M.shape[-1])
+    return M[..., rows, cols]
+
+
+def unpack_upper(v, diagonal=1):
+    """
+    Turns a packed vector, or a stack of them, back into full symmetric matrices
+    with the given diagonal
+    """
+    v = np.asarray(v)
+    p = packed_p(v.shape[-1])
+    rows, cols = upper_indices(p)
+    M = np.empty(v.shape[:-1] + (p, p), dtype=v.dtype)
+    M[..., rows, cols] = v
+    M[..., cols, rows] = v
+    idx = np.arange(p)
+    M[..., idx, idx] = diagonal
+    return M
+
+
+class PackedWindows:
+    """
+    (windows, p, p) view of a stack of packed symmetric matrices, windows are
+    unpacked on access and packed on assignment
+    """
+
+    def __init__(self, packed, diagonal=1):
+        self.packed = packed
+        self.diagonal = diagonal
+        self.p = packed_p(packed.shape[1])
+        self.shape = (packed.shape[0], self.p, self.p)
+        self.dtype = packed.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, i):
+        return unpack_upper(self.packed[i], self.diagonal)
+
+    def __setitem__(self, i, M):
+        self.packed[i] = pack_upper(M)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def flush(self):
+        if hasattr(self.packed, 'flush'):
+            self.packed.flush()
+
+
+def packed_window(matrices, i):
+    """
+    Returns the packed upper triangle of window i, without unpacking it if the windows are already packed
+    """
+    if isinstance(matrices, WindowCollection):
+        if not isinstance(matrices.windows, PackedWindows):
+            return pack_upper(matrices[i])
+        matrices = matrices.windows
+    if isinstance(matrices, PackedWindows):
+        return np.asarray(matrices.packed[i])
+    return pack_upper(matrices[i])
+
+
+def store_path(networks_folder):
+    """
+    Returns the folder holding the window store of a networks folder
+    """
+    return os.path.join(networks_folder, STORE_FOLDER)
+
+
+def store_exists(networks_folder):
+    """
+    Checks if a networks folder has a window store
+    """
+    folder = store_path(networks_folder)
+    return os.path.isfile(os.path.join(folder, MATRICES_FILE)) and os.path.isfile(os.path.join(folder, MANIFEST_FILE))
+
+
+def write_manifest(networks_folder, manifest):
+    """
+    Writes the manifest describing the windows held in the store
+    """
+    folder = store_path(networks_folder)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def update_manifest(networks_folder, **fields):
+    """
+    Adds or replaces fields of the manifest of a window store
+    """
+    manifest = read_manifest(networks_folder)
+    manifest.update(fields)
+    write_manifest(networks_folder, manifest)
+
+
+def read_manifest(networks_folder):
+    """
+    Reads the manifest of a window store
+    """
+    with open(os.path.join(store_path(networks_folder), MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def create_store(networks_folder, no_windows, p, manifest, dtype=np.float64, packed=False):
+    """
+    Creates a window store holding a (no_windows, p, p) array of network matrices,
+    or a (no_windows, p(p-1)/2) array of their upper triangles if packed
+
+    Parameters
+    ----------
+    networks_folder : str
+        Folder the store is created in (under store/)
+    no_windows : int
+        Number of windows the store holds
+    p : int
+        Number of companies
+    manifest : dict
+        Company names, sectors, window dates, estimator and so on, anything json serializable
+    dtype : numpy dtype (optional, default=np.float64)
+        Type the matrices are stored as
+    packed : bool (optional, default=False)
+        Only store the strict upper triangle, the matrices must be symmetric with a unit diagonal
+    Returns
+    -------
+    matrices : np.memmap or PackedWindows
+        Writable memory mapped array, window i is filled in with matrices[i] = M
+    """
+    folder = store_path(networks_folder)
+    os.makedirs(folder, exist_ok=True)
+    shape = (no_windows, packed_size(p)) if packed else (no_windows, p, p)
+    manifest = dict(manifest, shape=list(shape), dtype=np.dtype(dtype).name, packed=packed)
+    write_manifest(networks_folder, manifest)
+    matrices = np.lib.format.open_memmap(os.path.join(folder, MATRICES_FILE), mode='w+',
+                                         dtype=dtype, shape=shape)
+    return PackedWindows(matrices) if packed else matrices
+
+
+def open_store(networks_folder, mode='r'):
+    """
+    Opens a window store without reading it, the matrices are paged in on access
+
+    Returns
+    -------
+    tuple (matrices, manifest)
+        matrices is a (windows, p, p) memory mapped array, or a PackedWindows over the
+        memory mapped upper triangles of a packed store, and manifest the dict written with it
+    """
+    matrices = np.load(os.path.join(store_path(networks_folder), MATRICES_FILE), mmap_mode=mode)
+    manifest = read_manifest(networks_folder)
+    if manifest.get('packed', False):
+        matrices = PackedWindows(matrices)
+    return matrices, manifest
+
+
+class SparseWindows:
+    """
+    Sequence of the CSR matrices of a sparse store, each window is a view into
+    the concatenated (memory mapped) CSR arrays
+    """
+
+    def __init__(self, data, indices, indptr, offsets):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.offsets = offsets
+        p = indptr.shape[1] - 1
+        self.shape = (indptr.shape[0], p, p)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, i):
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return scipy.sparse.csr_matrix((self.data[start:stop], self.indices[start:stop], self.indptr[i]),
+                                       shape=self.shape[1:])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def write_sparse_store(networks_folder, matrices, method, value):
+    """
+    Writes a sequence of CSR matrices, one per window, next to the dense store of a networks folder
+    """
+    data, indices, indptr, offsets = [], [], [], [0]
+    for M in matrices:
+        M = scipy.sparse.csr_matrix(M)
+        data.append(M.data)
+        indices.append(M.indices)
+        indptr.append(M.indptr)
+        offsets.append(offsets[-1] + M.nnz)
+    folder = store_path(networks_folder)
+    os.makedirs(folder, exist_ok=True)
+    for name, values in zip(SPARSE_FILES, [np.concatenate(data), np.concatenate(indices), np.stack(indptr), np.array(offsets)]):
+        np.save(os.path.join(folder, name + '.npy'), values)
+    update_manifest(networks_folder, sparse={'method': method, 'value': value, 'nnz': offsets[1:]})
+
+
+def sparse_store_exists(networks_folder):
+    """
+    Checks if a networks folder has a sparse store
+    """
+    return all(os.path.isfile(os.path.join(store_path(networks_folder), name + '.npy')) for name in SPARSE_FILES)
+
+
+def open_sparse_store(networks_folder):
+    """
+    Opens the sparse store of a networks folder
+
+    Returns
+    -------
+    tuple (matrices, manifest)
+        matrices is a SparseWindows giving a CSR matrix per window
+    """
+    folder = store_path(networks_folder)
+    arrays = [np.load(os.path.join(folder, name + '.npy'), mmap_mode='r') for name in SPARSE_FILES]
+    return SparseWindows(*arrays), read_manifest(networks_folder)
+
+
+def matrix_to_graph(M, company_names, company_sectors):
+    """
+    Turns a network matrix, dense or scipy sparse, into a networkx graph with company
+    names as nodes and a sector attribute
+    """
+    if scipy.sparse.issparse(M):
+        G = nx.from_scipy_sparse_matrix(M)
+    else:
+        G = nx.from_numpy_array(np.asarray(M))
+    # Plain str rather than numpy strings, which the GraphML writer rejects
+    company_names = [str(name) for name in company_names]
+    G = nx.relabel_nodes(G, dict(zip(G.nodes(), company_names)))
+    nx.set_node_attributes(G, {name: str(sector) for name, sector in zip(company_names, company_sectors)}, 'sector')
+    return G
+
+
+def graphml_files(networks_folder):
+    """
+    Returns the GraphML files in a networks folder sorted by window number, as listed in
+    the manifest if the folder has a store, else by the number ending each file name
+    """
+    if store_exists(networks_folder):
+        files = read_manifest(networks_folder).get('graphml_files')
+        if files is not None:
+            return [os.path.abspath(os.path.join(networks_folder, f)) for f in files]
+    onlyfiles = [os.path.abspath(os.path.join(networks_folder, f)) for f in os.listdir(networks_folder) if os.path.isfile(os.path.join(networks_folder, f)) and f.endswith('.graphml')]
+    ind = [int(re.search(r'(\d+)\.graphml$', f).group(1)) for f in onlyfiles]
+    return [onlyfiles[i] for i in np.argsort(np.array(ind))]
+
+
+class WindowIndex:
+    """
+    Maps window numbers to their start and end dates, as kept in the manifest, so windows
+    can be looked up by date with a binary search instead of scanning every window
+    """
+
+    def __init__(self, start_dates, end_dates, files=None):
+        """
+        Parameters
+        ----------
+        start_dates, end_dates : list
+            First and last date of every window, in window order
+        files : list (optional, default=None)
+            GraphML file of every window, if they were exported
+        """
+        self.start_dates = np.array(start_dates, dtype='datetime64[D]')
+        self.end_dates = np.array(end_dates, dtype='datetime64[D]')
+        self.files = files
+
+    @classmethod
+    def from_manifest(cls, manifest):
+        """
+        Returns the index of the windows described by a store manifest, window i is
+        window i of the store
+        """
+        if 'start_dates' not in manifest or 'end_dates' not in manifest:
+            # Folders of GraphML files without a store (or migrated with graphml_to_store)
+            # don't record the dates of their windows
+            raise ValueError("The manifest has no window dates, infer the networks again with infer_networks "
+                             "to look windows up by date")
+        return cls(manifest['start_dates'], manifest['end_dates'], manifest.get('graphml_files'))
+
+    def __len__(self):
+        return len(self.end_dates)
+
+    def in_force(self, date):
+        """
+        Returns the window whose network is in force on date, the last one to have ended
+        on or before it, or None if no window had ended yet
+        """
+        i = np.searchsorted(self.end_dates, np.datetime64(date, 'D'), side='right') - 1
+        return None if i < 0 else int(i)
+
+    def ending_between(self, start, end):
+        """
+        Returns the range of windows ending between the dates start and end (both included)
+        """
+        lo = np.searchsorted(self.end_dates, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.end_dates, np.datetime64(end, 'D'), side='right')
+        return range(int(lo), int(hi))
+
+    def covering(self, date):
+        """
+        Returns the range of windows whose returns include date
+        """
+        date = np.datetime64(date, 'D')
+        lo = np.searchsorted(self.end_dates, date, side='left')
+        hi = np.searchsorted(self.start_dates, date, side='right')
+        return range(int(lo), int(max(lo, hi)))
+
+
+class WindowCollection:
+    """
+    Sequence of the networks of a folder that loads a window only when it is accessed,
+    keeps the most recently used ones in an LRU cache and loads the next window in a
+    background thread while the current one is processed
+    """
+
+    def __init__(self, load, no_windows, p, dtype, cache_size=8, prefetch=True, windows=None):
+        """
+        Parameters
+        ----------
+        load : callable
+            Returns the network of window i
+        no_windows, p : int
+            Number of windows and of companies
+        dtype : numpy dtype
+            Type of the networks
+        cache_size : int (optional, default=8)
+            Number of windows kept in memory
+        prefetch : bool (optional, default=True)
+            Load window i+1 in the background whenever window i is accessed
+        windows : sequence (optional, default=None)
+            Stored windows load reads from, if any
+        """
+        self.load = load
+        self.shape = (no_windows, p, p)
+        self.dtype = np.dtype(dtype)
+        self.cache_size = cache_size
+        self.windows = windows
+        self.cache = OrderedDict()
+        # (window, future) of the one background load in flight, if any
+        self.pending = None
+        self.executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Window %s out of range" % i)
+        if i in self.cache:
+            self.cache.move_to_end(i)
+            M = self.cache[i]
+        else:
+            M = self._take_pending(i)
+            if M is None:
+                M = self.load(i)
+            self._keep(i, M)
+        if self.executor is not None:
+            self.prefetch(i + 1)
+        return M
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _keep(self, i, M):
+        self.cache[i] = M
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _take_pending(self, i):
+        # Returns the background load of window i, a load of any other window is dropped so
+        # at most one window is held outside the cache
+        if self.pending is None:
+            return None
+        j, future = self.pending
+        self.pending = None
+        if j == i:
+            return future.result()
+        future.cancel()
+        return None
+
+    def prefetch(self, i):
+        """
+        Starts loading window i in the background if it isn't cached or being loaded already,
+        replacing the load of any other window
+        """
+        if i >= len(self) or i in self.cache or (self.pending is not None and self.pending[0] == i):
+            return
+        if self.pending is not None:
+            self.pending[1].cancel()
+        self.pending = (i, self.executor.submit(self.load, i))
+
+    def close(self):
+        """
+        Stops the background loading
+        """
+        if self.pending is not None:
+            self.pending[1].cancel()
+            self.pending = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_graphml_window(path, company_names):
+    """
+    Reads a GraphML network as a matrix with the companies in the order given
+    """
+    return read_graphml_matrix(path, company_names)[0]
+
+
+def graphml_to_store(networks_folder, workers=None, packed=False):
+    """
+    Migrates a folder of GraphML networks to a window store, reading the files in parallel
+    and writing every window into the store as it is parsed, so only a few are in memory at once
+    """
+    files = graphml_files(networks_folder)
+    first, company_names, attributes = read_graphml_matrix(files[0])
+    manifest = {
+        'company_names': company_names,
+        'company_sectors': attributes['sector'],
+        'graphml_files': [os.path.basename(f) for f in files],
+    }
+    store = create_store(networks_folder, len(files), len(company_names), manifest, packed=packed)
+    store[0] = first
+    for i, M in enumerate(iter_graphml_matrices(files[1:], company_names, workers=workers), start=1):
+        store[i] = M
+    store.flush()
+
+
+def load_networks(networks_folder, sparse=False, cache_size=8, prefetch=True):
+    """
+    Loads the networks of a folder from its window store, falling back on
+    reading the GraphML files if the folder was written without a store,
+    or from its sparse store if sparse
+
+    Windows are only read when accessed, see WindowCollection
+
+    Returns
+    -------
+    tuple (matrices, manifest)
+        matrices is a WindowCollection of (p, p) arrays, or of CSR matrices if sparse
+    """
+    if sparse:
+        windows, manifest = open_sparse_store(networks_folder)
+        return WindowCollection(windows.__getitem__, len(windows), windows.shape[1], windows.data.dtype,
+                                cache_size, prefetch, windows), manifest
+    if store_exists(networks_folder):
+        windows, manifest = open_store(networks_folder)
+        return WindowCollection(lambda i: np.array(windows[i]), len(windows), windows.shape[1], windows.dtype,
+                                cache_size, prefetch, windows), manifest
+
+    files = graphml_files(networks_folder)
+    _, company_names, attributes = read_graphml_matrix(files[0])
+    manifest = {
+        'company_names': company_names,
+        'company_sectors': attributes['sector'],
+    }
+    return WindowCollection(lambda i: read_graphml_window(files[i], company_names), len(files), len(company_names), np.float64,
+                            cache_size, prefetch), manifest